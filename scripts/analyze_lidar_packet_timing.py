@@ -5,10 +5,7 @@ from __future__ import annotations
 
 import argparse
 import json
-import socket
 import statistics
-import struct
-import time
 from collections import Counter
 from datetime import datetime
 from pathlib import Path
@@ -16,6 +13,8 @@ from pathlib import Path
 import matplotlib.pyplot as plt
 import requests
 
+from lidar_rx import TIMESTAMP_MODES, capture_udp
+
 
 DOC_URL = (
     "https://static.ouster.dev/sensor-docs/image_route1/image_route2/"
@@ -65,35 +64,6 @@ def expected_pps(cfg: dict, md: dict) -> float:
     return packets_per_frame * hz
 
 
-def capture_udp(port: int, duration_s: float, rcvbuf: int) -> list[dict]:
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
-    sock.bind(("0.0.0.0", port))
-    sock.settimeout(1.0)
-    start = time.perf_counter()
-    rows: list[dict] = []
-    while time.perf_counter() - start < duration_s:
-        try:
-            data, _ = sock.recvfrom(65535)
-            t = time.perf_counter()
-            frame_id = None
-            packet_type = None
-            if len(data) >= 4:
-                packet_type, frame_id = struct.unpack_from("<HH", data, 0)
-            rows.append(
-                {
-                    "t_s": t,
-                    "len": len(data),
-                    "packet_type": packet_type,
-                    "frame_id": frame_id,
-                }
-            )
-        except socket.timeout:
-            continue
-    sock.close()
-    return rows
-
-
 def build_metrics(rows: list[dict], pps_expected: float) -> dict:
     if len(rows) < 3:
         raise RuntimeError("not enough packets captured")
@@ -206,13 +176,23 @@ def main():
     ap.add_argument("--port", type=int, default=7502)
     ap.add_argument("--duration-s", type=float, default=60.0)
     ap.add_argument("--rcvbuf", type=int, default=8 * 1024 * 1024)
+    ap.add_argument("--rx-backend", choices=["mmsg", "recvfrom"], default="mmsg")
+    ap.add_argument("--rx-batch", type=int, default=64, help="datagrams per recvmmsg call")
+    ap.add_argument(
+        "--ts-mode",
+        choices=TIMESTAMP_MODES,
+        default="kernel",
+        help="receive timestamps: user clock, kernel SO_TIMESTAMPNS or NIC hardware",
+    )
     ap.add_argument("--outdir", default="/home/kim/lidar-tas260226/data")
     args = ap.parse_args()
 
     cfg, md = query_sensor(args.host)
     pkt_size_exp = expected_packet_size(cfg, md)
     pps_exp = expected_pps(cfg, md)
-    rows = capture_udp(args.port, args.duration_s, args.rcvbuf)
+    rows, rx_info = capture_udp(
+        args.port, args.duration_s, args.rcvbuf, args.rx_backend, args.rx_batch, args.ts_mode
+    )
     metrics = build_metrics(rows, pps_exp)
 
     outdir = Path(args.outdir)
@@ -224,6 +204,11 @@ def main():
     data = {
         "timestamp": ts,
         "doc_reference": DOC_URL,
+        "rx_backend": rx_info["backend"],
+        # Clock that stamped the packets behind the dt statistics.
+        "rx_ts_mode": rx_info["ts_mode"],
+        "rx_clock_source": rx_info["clock_source"],
+        "rx_ts_mismatch": rx_info["ts_mismatch"],
         "sensor_config": {
             "udp_profile_lidar": cfg.get("udp_profile_lidar"),
             "columns_per_packet": cfg.get("columns_per_packet"),
@@ -243,6 +228,13 @@ def main():
             "packet_rate_hz_formula": pps_exp,
         },
         "measured": metrics,
+        "host_rx": {
+            "kernel_drops": rx_info["kernel_drops"],
+            "kernel_drops_source": rx_info["kernel_drops_source"],
+            "kernel_drops_per_s": rx_info["kernel_drops_per_s"],
+            # Nonzero means packets were lost on this host, not at the TAS gate.
+            "contaminated": rx_info["kernel_drops"] > 0,
+        },
         "plots": plots,
     }
 
@@ -255,6 +247,8 @@ def main():
         "",
         f"- source: `{out_json.name}`",
         f"- docs: {DOC_URL}",
+        f"- rx_backend: `{rx_info['backend']}`",
+        f"- rx_clock_source: `{rx_info['clock_source']}` (requested `{rx_info['ts_mode']}`, {rx_info['ts_mismatch']} packets on another clock left out)",
         "",
         "## Config",
         f"- udp_profile_lidar: `{cfg.get('udp_profile_lidar')}`",
@@ -279,6 +273,7 @@ def main():
         f"- dt_min/max_us: `{metrics['dt_min_us']:.3f}` / `{metrics['dt_max_us']:.3f}`",
         f"- packet_len_mean/min/max: `{metrics['packet_len_mean']:.1f}` / `{metrics['packet_len_min']}` / `{metrics['packet_len_max']}`",
         f"- packets_per_frame median/min/max: `{metrics['packets_per_frame_median']}` / `{metrics['packets_per_frame_min']}` / `{metrics['packets_per_frame_max']}`",
+        f"- kernel_drops (host-side, {rx_info['kernel_drops_source']}): `{rx_info['kernel_drops']}`",
         "",
         "## Graphs",
         f"- inter-packet series: `{Path(plots['dt_series_png']).name}`",
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""Benchmark lidar_motion (packed keys, bulk union-find) against the tuple/set detect_motion."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from lidar_motion import (
+    DecayingBackground,
+    RangeImageMotion,
+    background_from_history,
+    motion_clusters,
+    voxel_keys,
+    voxelize,
+)
+from lidar_tracker import MultiObjectTracker
+
+RANGE_MIN_MM = 300
+RANGE_MAX_MM = 100_000
+
+
+def legacy_background(history: list[set], min_hits: int) -> set:
+    count = Counter()
+    for s in history:
+        count.update(s)
+    return {k for k, v in count.items() if v >= min_hits}
+
+
+def legacy_motion(points: np.ndarray, voxel_m: float, bg: set) -> tuple[np.ndarray, list[dict]]:
+    """detect_motion after warm-up, as it was before packed keys."""
+    vox = voxelize(points, voxel_m)
+    current_vox_set = set(map(tuple, vox.tolist()))
+    moving_vox = current_vox_set - bg
+    if not moving_vox:
+        return np.empty((0, 3), dtype=np.float32), []
+
+    voxel_points = {}
+    for i, vk in enumerate(map(tuple, vox.tolist())):
+        if vk in moving_vox:
+            voxel_points.setdefault(vk, []).append(points[i])
+
+    unvisited = set(moving_vox)
+    clusters = []
+    neighbors = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]
+    while unvisited:
+        seed = unvisited.pop()
+        q = [seed]
+        cluster_vox = {seed}
+        while q:
+            cx, cy, cz = q.pop()
+            for dx, dy, dz in neighbors:
+                nb = (cx + dx, cy + dy, cz + dz)
+                if nb in unvisited:
+                    unvisited.remove(nb)
+                    q.append(nb)
+                    cluster_vox.add(nb)
+        clusters.append(cluster_vox)
+
+    tracks = []
+    moving_pts = []
+    for cid, cvox in enumerate(sorted(clusters, key=len, reverse=True)[:5], start=1):
+        pts = []
+        for vk in cvox:
+            pts.extend(voxel_points.get(vk, []))
+        if len(pts) < 12:
+            continue
+        arr = np.asarray(pts, dtype=np.float32)
+        center = arr.mean(axis=0)
+        tracks.append({"id": cid, "points": int(arr.shape[0]), "centroid": [float(c) for c in center]})
+        moving_pts.append(arr)
+    if moving_pts:
+        return np.concatenate(moving_pts, axis=0), tracks
+    return np.empty((0, 3), dtype=np.float32), []
+
+
+def synth_scene(
+    n_points: int,
+    n_movers: int,
+    n_frames: int,
+    mover_points: int = 400,
+    mover_size_m: float = 0.6,
+    seed: int = 0,
+) -> list[np.ndarray]:
+    """Static ground + walls with range noise, plus box-shaped movers walking across.
+
+    A large `mover_size_m` / `mover_points` mimics a person right next to
+    the sensor, which yields thousands of moving voxels.
+    """
+    rng = np.random.default_rng(seed)
+    n_static = n_points - n_movers * mover_points
+    half = mover_size_m / 2
+    ground = np.column_stack(
+        [rng.uniform(-30, 30, n_static // 2), rng.uniform(-30, 30, n_static // 2), np.full(n_static // 2, -1.6)]
+    )
+    n_wall = n_static - ground.shape[0]
+    ang = rng.uniform(0, 2 * np.pi, n_wall)
+    walls = np.column_stack([25 * np.cos(ang), 25 * np.sin(ang), rng.uniform(-1.6, 3.0, n_wall)])
+    static = np.concatenate([ground, walls]).astype(np.float32)
+    starts = rng.uniform(-15, 15, (n_movers, 2))
+    vel = rng.uniform(-0.3, 0.3, (n_movers, 2))
+    frames = []
+    for f in range(n_frames):
+        pts = [static + rng.normal(0, 0.02, static.shape).astype(np.float32)]
+        for m in range(n_movers):
+            c = starts[m] + vel[m] * f
+            box = rng.uniform([-half, -half, -1.55], [half, half, 0.3], (mover_points, 3)) + [c[0], c[1], 0.0]
+            pts.append(box.astype(np.float32))
+        frames.append(np.concatenate(pts))
+    return frames
+
+
+def synth_range_frames(h: int, w: int, n_movers: int, n_frames: int, seed: int = 0) -> tuple[list[np.ndarray], tuple]:
+    """Range images (mm, h x w, zero pixel shift) of ground + 25 m wall with walking cylinders."""
+    rng = np.random.default_rng(seed)
+    el = np.deg2rad(np.linspace(22.5, -22.5, h))[:, None]
+    az = np.linspace(0, 2 * np.pi, w, endpoint=False)[None, :]
+    cos_el = np.cos(el)
+    sin_el = np.sin(el)
+    ground = np.where(sin_el < 0, -1.6 / np.minimum(sin_el, -1e-6), np.inf)
+    static = np.minimum(ground, 25.0 / cos_el) * np.ones_like(az)
+    starts = rng.uniform(-12, 12, (n_movers, 2))
+    vel = rng.uniform(-0.3, 0.3, (n_movers, 2))
+    frames = []
+    for f in range(n_frames):
+        r = static.copy()
+        for m in range(n_movers):
+            x, y = starts[m] + vel[m] * f
+            p = x * np.cos(az) + y * np.sin(az)
+            q2 = x * x + y * y - p * p
+            th = p - np.sqrt(np.maximum(0.09 - q2, 0.0))
+            t = th / cos_el
+            z = th * np.tan(el)
+            hit = (q2 < 0.09) & (p > 0) & (z > -1.6) & (z < 0.3) & (t < r)
+            r = np.where(hit, t, r)
+        r = r * 1000.0 + rng.normal(0, 10.0, r.shape)
+        frames.append(np.clip(r, 0, RANGE_MAX_MM + 1).astype(np.uint32))
+    direction = np.stack(
+        np.broadcast_arrays(cos_el * np.cos(az), cos_el * np.sin(az), sin_el * np.ones_like(az)), axis=-1
+    ).reshape(-1, 3)
+    lut = ((direction / 1000.0).astype(np.float32), np.zeros_like(direction, dtype=np.float32))
+    return frames, lut
+
+
+def bench_range_image(resolutions: list[str], n_movers: int, n_frames: int, voxel_m: float) -> list[dict]:
+    """ms/frame of the range-image backend vs voxel keys + decaying background per resolution."""
+    rows = []
+    warm = max(1, n_frames // 3)
+    for res in resolutions:
+        h, w = (int(v) for v in res.split("x"))
+        frames, lut = synth_range_frames(h, w, n_movers, n_frames)
+        ri = RangeImageMotion(h, w, [0] * h, lut, RANGE_MIN_MM, RANGE_MAX_MM)
+        bg = DecayingBackground()
+        ri_ms = []
+        vox_ms = []
+        ri_tracks = 0
+        for i, fr in enumerate(frames):
+            t0 = time.perf_counter()
+            _, tracks = ri.update(fr)
+            t1 = time.perf_counter()
+            flat = fr.reshape(-1)
+            idx = np.flatnonzero((flat > RANGE_MIN_MM) & (flat < RANGE_MAX_MM))
+            pts = lut[0][idx] * flat[idx, None].astype(np.float32) + lut[1][idx]
+            t2 = time.perf_counter()
+            keys = voxel_keys(pts, voxel_m)
+            ukeys = np.unique(keys)
+            motion_clusters(pts, keys, ukeys[bg.update(ukeys)])
+            t3 = time.perf_counter()
+            if i >= warm:
+                ri_ms.append((t1 - t0) * 1e3)
+                vox_ms.append((t3 - t2) * 1e3)
+                ri_tracks += len(tracks)
+        rows.append(
+            {
+                "resolution": res,
+                "pixels": h * w,
+                "range_image_ms": statistics.mean(ri_ms),
+                "voxel_decay_ms": statistics.mean(vox_ms),
+                "range_image_tracks_per_frame": ri_tracks / len(ri_ms),
+            }
+        )
+    return rows
+
+
+def bench_tracker(n_objects: int, n_frames: int, fps: float = 10.0, noise_m: float = 0.05) -> dict:
+    """Tracker ms/frame and id switches for objects on a grid moving at constant velocity."""
+    rng = np.random.default_rng(2)
+    side = int(np.ceil(np.sqrt(n_objects)))
+    grid = np.stack(np.meshgrid(np.arange(side), np.arange(side)), axis=-1).reshape(-1, 2)[:n_objects]
+    start = np.column_stack([grid * 4.0 - side * 2.0, np.zeros(n_objects)])
+    vel = np.column_stack([rng.uniform(-1.5, 1.5, (n_objects, 2)), np.zeros(n_objects)])
+    tracker = MultiObjectTracker(max_tracks=n_objects)
+    ms = []
+    switches = 0
+    prev = {}
+    for f in range(n_frames):
+        t = f / fps
+        pos = start + vel * t + rng.normal(0.0, noise_m, (n_objects, 3))
+        # Shuffled like cluster size ranks, which reorder every frame.
+        order = rng.permutation(n_objects)
+        dets = [{"id": 0, "points": 50, "centroid": pos[i].tolist()} for i in order]
+        t0 = time.perf_counter()
+        tracks = tracker.update(dets, t)
+        ms.append((time.perf_counter() - t0) * 1e3)
+        ids = {int(order[k]): tr["id"] for k, tr in enumerate(tracks)}
+        switches += sum(1 for obj, tid in ids.items() if obj in prev and prev[obj] != tid)
+        prev = ids
+    return {
+        "objects": n_objects,
+        "frames": n_frames,
+        "ms_mean": statistics.mean(ms),
+        "ms_p99": float(np.percentile(ms, 99)),
+        "id_switches": switches,
+        "tracks_created": tracker.created,
+    }
+
+
+def check_decay_cap(max_voxels: int = 1000, frame_keys: int = 30000, frames: int = 3) -> dict:
+    """Regression: a frame with more unique keys than the table has slots must not hang or exceed the cap."""
+    bg = DecayingBackground(max_voxels)
+    rng = np.random.default_rng(3)
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        keys = np.unique(rng.integers(0, 1 << 62, frame_keys, dtype=np.int64))
+        mask = bg.update(keys)
+        if mask.shape != keys.shape or bg.size > bg.max_voxels:
+            raise AssertionError(f"DecayingBackground cap broken: size {bg.size} > {bg.max_voxels}")
+    if bg.overflow != frames * frame_keys - bg.size - bg.evictions:
+        raise AssertionError(f"overflow {bg.overflow} does not account for every key left out")
+    # A scene change with more new keys than the table holds keeps most of the learned static voxels.
+    static = np.unique(rng.integers(0, 1 << 62, max_voxels // 2, dtype=np.int64))
+    scene = DecayingBackground(max_voxels)
+    for _ in range(10):
+        scene.update(static)
+    scene.update(np.unique(np.concatenate([static, rng.integers(0, 1 << 62, frame_keys, dtype=np.int64)])))
+    kept = int(np.count_nonzero(scene.occupancy_of(static) > 0))
+    if kept < static.size:
+        raise AssertionError(f"scene change evicted {static.size - kept} of {static.size} static voxels")
+    return {
+        "max_voxels": bg.max_voxels,
+        "table_slots": bg._keys.size,
+        "frame_keys": frame_keys,
+        "size": bg.size,
+        "overflow": bg.overflow,
+        "static_kept": kept,
+        "ms": (time.perf_counter() - t0) * 1e3,
+    }
+
+
+def same_result(a: tuple[np.ndarray, list[dict]], b: tuple[np.ndarray, list[dict]]) -> bool:
+    """Equal moving point sets and track sizes; ids/order may differ on size ties."""
+    pa, pb = a[0], b[0]
+    if pa.shape != pb.shape:
+        return False
+    if pa.size and not np.array_equal(pa[np.lexsort(pa.T)], pb[np.lexsort(pb.T)]):
+        return False
+    return sorted(t["points"] for t in a[1]) == sorted(t["points"] for t in b[1])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--points", type=int, default=30000)
+    ap.add_argument("--movers", type=int, default=3)
+    ap.add_argument("--mover-points", type=int, default=400)
+    ap.add_argument("--mover-size-m", type=float, default=0.6)
+    ap.add_argument("--bg-frames", type=int, default=20)
+    ap.add_argument("--frames", type=int, default=50)
+    ap.add_argument("--voxel-m", type=float, default=0.25)
+    ap.add_argument(
+        "--ri-resolutions",
+        default="16x1024,16x2048,64x2048,128x2048",
+        help="comma list of HxW for the range-image vs voxel comparison ('' to skip)",
+    )
+    ap.add_argument("--ri-frames", type=int, default=30)
+    ap.add_argument("--track-objects", type=int, default=100)
+    ap.add_argument("--track-frames", type=int, default=100)
+    ap.add_argument("--outdir", default="/home/kim/lidar-tas260226/data")
+    ap.add_argument("--check", action="store_true", help="only run the regression checks and exit")
+    args = ap.parse_args()
+
+    cap = check_decay_cap()
+    if args.check:
+        print(json.dumps({"decay_cap": cap}, indent=2))
+        return
+
+    frames = synth_scene(
+        args.points, args.movers, args.bg_frames + args.frames, args.mover_points, args.mover_size_m
+    )
+    warm, live = frames[: args.bg_frames], frames[args.bg_frames :]
+    min_hits = max(2, int(len(warm) * 0.7))
+
+    t0 = time.perf_counter()
+    bg_set = legacy_background([set(map(tuple, voxelize(p, args.voxel_m).tolist())) for p in warm], min_hits)
+    legacy_bg_ms = (time.perf_counter() - t0) * 1e3
+    t0 = time.perf_counter()
+    bg_keys = background_from_history([np.unique(voxel_keys(p, args.voxel_m)) for p in warm], min_hits)
+    keys_bg_ms = (time.perf_counter() - t0) * 1e3
+
+    legacy_ms = []
+    keys_ms = []
+    identical = 0
+    for pts in live:
+        t0 = time.perf_counter()
+        ref = legacy_motion(pts, args.voxel_m, bg_set)
+        legacy_ms.append((time.perf_counter() - t0) * 1e3)
+        t0 = time.perf_counter()
+        new = motion_clusters(pts, voxel_keys(pts, args.voxel_m), bg_keys)
+        keys_ms.append((time.perf_counter() - t0) * 1e3)
+        identical += same_result(ref, new)
+
+    results = {
+        "legacy_sets": {
+            "background_ms": legacy_bg_ms,
+            "ms_mean": statistics.mean(legacy_ms),
+            "ms_p50": statistics.median(legacy_ms),
+        },
+        "packed_keys_unionfind": {
+            "background_ms": keys_bg_ms,
+            "ms_mean": statistics.mean(keys_ms),
+            "ms_p50": statistics.median(keys_ms),
+        },
+    }
+    speedup = results["legacy_sets"]["ms_mean"] / results["packed_keys_unionfind"]["ms_mean"]
+    resolutions = [r for r in args.ri_resolutions.split(",") if r]
+    ri_rows = bench_range_image(resolutions, args.movers, args.ri_frames, args.voxel_m) if resolutions else []
+    tracker = bench_tracker(args.track_objects, args.track_frames) if args.track_objects > 0 else None
+
+    outdir = Path(args.outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    stem = f"motion_bench_{ts}"
+    out = {
+        "timestamp": ts,
+        "points_per_frame": int(live[0].shape[0]),
+        "movers": args.movers,
+        "mover_points": args.mover_points,
+        "mover_size_m": args.mover_size_m,
+        "voxel_m": args.voxel_m,
+        "bg_frames": args.bg_frames,
+        "frames": args.frames,
+        "background_voxels": int(bg_keys.size),
+        "identical_frames": identical,
+        "speedup": speedup,
+        "results": results,
+        "range_image": ri_rows,
+        "tracker": tracker,
+        "decay_cap": cap,
+    }
+    p_json = outdir / f"{stem}.json"
+    p_md = outdir / f"{stem}.md"
+    p_json.write_text(json.dumps(out, indent=2), encoding="ascii")
+
+    lines = [
+        "# Motion Detection Benchmark",
+        "",
+        f"- points/frame: `{out['points_per_frame']}`, voxel: `{args.voxel_m} m`",
+        f"- movers: `{args.movers}` x `{args.mover_points}` points in `{args.mover_size_m} m` boxes",
+        f"- frames: `{args.bg_frames}` warm-up + `{args.frames}` timed",
+        f"- identical output: `{identical}/{args.frames}` frames",
+        f"- speedup: `{speedup:.1f}x`",
+        "",
+        "| implementation | background build ms | ms/frame mean | p50 |",
+        "|---|---:|---:|---:|",
+    ]
+    for name, r in results.items():
+        lines.append(f"| {name} | {r['background_ms']:.2f} | {r['ms_mean']:.3f} | {r['ms_p50']:.3f} |")
+    lines.append("")
+    if ri_rows:
+        lines += [
+            "## Range image vs voxel backend",
+            "",
+            "| resolution | pixels | range_image ms | voxel+decay ms | ratio | tracks/frame |",
+            "|---|---:|---:|---:|---:|---:|",
+        ]
+        for r in ri_rows:
+            lines.append(
+                f"| {r['resolution']} | {r['pixels']} | {r['range_image_ms']:.3f} | {r['voxel_decay_ms']:.3f} | "
+                f"{r['voxel_decay_ms'] / r['range_image_ms']:.1f}x | {r['range_image_tracks_per_frame']:.2f} |"
+            )
+        lines.append("")
+    if tracker:
+        lines += [
+            "## Tracker",
+            "",
+            f"- objects: `{tracker['objects']}` over `{tracker['frames']}` frames",
+            f"- ms/frame: mean `{tracker['ms_mean']:.3f}`, p99 `{tracker['ms_p99']:.3f}`",
+            f"- id switches: `{tracker['id_switches']}`, tracks created: `{tracker['tracks_created']}`",
+            "",
+        ]
+    p_md.write_text("\n".join(lines), encoding="ascii")
+    print("\n".join(lines))
+    print(p_json)
+    print(p_md)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Benchmark ouster_decode.PacketDecoder against ouster.sdk ScanBatcher."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import requests
+
+from ouster_decode import PacketDecoder
+
+
+def load_metadata(args) -> str:
+    if args.metadata:
+        return Path(args.metadata).read_text(encoding="utf-8")
+    return requests.get(f"http://{args.host}/api/v1/sensor/metadata", timeout=5).text
+
+
+def synth_frames(dec: PacketDecoder, md: dict, n_frames: int, seed: int = 0) -> list[np.ndarray]:
+    """Build full frames of valid packets with random channel data."""
+    rng = np.random.default_rng(seed)
+    sensor = md.get("sensor_info", {})
+    init_id = int(sensor.get("initialization_id", 0))
+    sn = int(sensor.get("prod_sn", 0) or 0)
+    cpp = dec.columns_per_packet
+    n_pkts = dec.columns_per_frame // cpp
+    frames = []
+    for f in range(n_frames):
+        arr = np.zeros(n_pkts, dtype=dec.dtype)
+        arr["packet_type"] = 1
+        arr["frame_id"] = f + 1
+        arr["init_sn"] = init_id | (sn << 24)
+        cols = arr["columns"]
+        cols["measurement_id"] = np.arange(dec.columns_per_frame, dtype=np.uint16).reshape(n_pkts, cpp)
+        cols["timestamp"] = (f * 100_000_000 + np.arange(dec.columns_per_frame) * 48_828).reshape(n_pkts, cpp)
+        cols["status"] = 1
+        px = cols["pixels"]
+        px["range_word"] = rng.integers(300, 60_000, px.shape)
+        px["reflectivity"] = rng.integers(0, 255, px.shape)
+        px["nir"] = rng.integers(0, 255, px.shape)
+        if "signal" in px.dtype.names:
+            px["signal"] = rng.integers(0, 4000, px.shape)
+        frames.append(arr.view(np.uint8).reshape(n_pkts, dec.packet_size))
+    return frames
+
+
+def bench_batcher(meta_raw: str, frames: list[np.ndarray], repeat: int) -> list[float]:
+    import ouster.sdk.core as core
+
+    info = core.SensorInfo(meta_raw)
+    h = info.format.pixels_per_column
+    w = info.format.columns_per_frame
+    pkt_size = frames[0].shape[1]
+    pkts = [core.LidarPacket(pkt_size) for _ in range(frames[0].shape[0])]
+    batcher = core.ScanBatcher(info)
+    scan = core.LidarScan(h, w, info.format.udp_profile_lidar)
+    times = []
+    for _ in range(repeat):
+        for fr in frames:
+            t0 = time.perf_counter()
+            for i, pkt in enumerate(pkts):
+                pkt.buf[:] = fr[i]
+                batcher(pkt, scan)
+            times.append((time.perf_counter() - t0) * 1e3)
+    return times
+
+
+def bench_decoder(dec: PacketDecoder, frames: list[np.ndarray], repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        for fr in frames:
+            t0 = time.perf_counter()
+            dec.to_images(dec.decode(fr))
+            times.append((time.perf_counter() - t0) * 1e3)
+    return times
+
+
+def summarize(times: list[float], n_pkts: int) -> dict:
+    ts = sorted(times)
+    mean = statistics.mean(ts)
+    return {
+        "frames": len(ts),
+        "ms_mean": mean,
+        "ms_p50": ts[len(ts) // 2],
+        "ms_p95": ts[min(len(ts) - 1, int(len(ts) * 0.95))],
+        "pkts_per_s": n_pkts / (mean / 1e3) if mean > 0 else 0.0,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="192.168.6.11")
+    ap.add_argument("--metadata", default="", help="sensor metadata JSON file instead of querying --host")
+    ap.add_argument("--frames", type=int, default=20)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--skip-batcher", action="store_true", help="decoder only (no ouster.sdk on this box)")
+    ap.add_argument("--outdir", default="/home/kim/lidar-tas260226/data")
+    args = ap.parse_args()
+
+    meta_raw = load_metadata(args)
+    md = json.loads(meta_raw)
+    fmt = md["lidar_data_format"]
+    dec = PacketDecoder(
+        fmt["udp_profile_lidar"],
+        int(fmt["columns_per_packet"]),
+        int(fmt["pixels_per_column"]),
+        int(fmt["columns_per_frame"]),
+    )
+    frames = synth_frames(dec, md, args.frames)
+    n_pkts = frames[0].shape[0]
+
+    results = {"numpy_decoder": summarize(bench_decoder(dec, frames, args.repeat), n_pkts)}
+    if not args.skip_batcher:
+        results["scan_batcher"] = summarize(bench_batcher(meta_raw, frames, args.repeat), n_pkts)
+
+    outdir = Path(args.outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    stem = f"decode_bench_{ts}"
+    out = {
+        "timestamp": ts,
+        "udp_profile_lidar": fmt["udp_profile_lidar"],
+        "columns_per_frame": fmt["columns_per_frame"],
+        "pixels_per_column": fmt["pixels_per_column"],
+        "columns_per_packet": fmt["columns_per_packet"],
+        "packet_size": dec.packet_size,
+        "packets_per_frame": n_pkts,
+        "results": results,
+    }
+    p_json = outdir / f"{stem}.json"
+    p_md = outdir / f"{stem}.md"
+    p_json.write_text(json.dumps(out, indent=2), encoding="ascii")
+
+    lines = [
+        "# Packet Decode Benchmark",
+        "",
+        f"- profile: `{fmt['udp_profile_lidar']}`",
+        f"- frame: `{fmt['pixels_per_column']}x{fmt['columns_per_frame']}`, `{n_pkts}` packets of `{dec.packet_size}B`",
+        f"- frames x repeat: `{args.frames} x {args.repeat}`",
+        "",
+        "| decoder | ms/frame mean | p50 | p95 | packets/s |",
+        "|---|---:|---:|---:|---:|",
+    ]
+    for name, r in results.items():
+        lines.append(f"| {name} | {r['ms_mean']:.3f} | {r['ms_p50']:.3f} | {r['ms_p95']:.3f} | {r['pkts_per_s']:.0f} |")
+    lines.append("")
+    p_md.write_text("\n".join(lines), encoding="ascii")
+    print("\n".join(lines))
+    print(p_json)
+    print(p_md)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Size and CPU of the point transport encodings per lidar_mode (synthetic scans)."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+import lidar_pointcodec
+from bench_motion import RANGE_MAX_MM, RANGE_MIN_MM, synth_range_frames
+
+MODES = ["512x10", "512x20", "1024x10", "1024x20", "2048x10"]
+
+
+def pack_f32(pts: np.ndarray) -> bytes:
+    return np.ascontiguousarray(pts, dtype="<f4").tobytes()
+
+
+def variants() -> list[tuple[str, object, object]]:
+    """(name, encode(pts, mpts) -> bytes, decode(bytes) -> points)."""
+    out = [
+        ("f32", lambda p, m: pack_f32(p), lambda b: np.frombuffer(b, "<f4").reshape(-1, 3)),
+        (
+            "f32+gzip",
+            lambda p, m: zlib.compress(pack_f32(p), 1),
+            lambda b: np.frombuffer(zlib.decompress(b), "<f4").reshape(-1, 3),
+        ),
+    ]
+    for enc in lidar_pointcodec.ENCODINGS:
+        for comp in lidar_pointcodec.available_compressions():
+            out.append(
+                (
+                    f"{enc}+{comp}" if comp != "none" else enc,
+                    lambda p, m, enc=enc, comp=comp: lidar_pointcodec.encode(0, p, m, [], enc == "q16d", comp),
+                    lambda b: lidar_pointcodec.decode(b)[1],
+                )
+            )
+    return out
+
+
+def bench_mode(mode: str, beams: int, frames: int) -> list[dict]:
+    w, fps = (int(v) for v in mode.split("x"))
+    scans, (direction, offset) = synth_range_frames(beams, w, 3, frames)
+    clouds = []
+    for r in scans:
+        flat = r.reshape(-1)
+        idx = np.flatnonzero((flat > RANGE_MIN_MM) & (flat < RANGE_MAX_MM))
+        clouds.append(direction[idx] * flat[idx, None].astype(np.float32) + offset[idx])
+    mpts = np.empty((0, 3), dtype=np.float32)
+
+    rows = []
+    for name, enc, dec in variants():
+        sizes, enc_ms, dec_ms, err = [], [], [], 0.0
+        for pts in clouds:
+            t0 = time.perf_counter()
+            body = enc(pts, mpts)
+            t1 = time.perf_counter()
+            back = dec(body)
+            t2 = time.perf_counter()
+            sizes.append(len(body))
+            enc_ms.append((t1 - t0) * 1e3)
+            dec_ms.append((t2 - t1) * 1e3)
+            err = max(err, float(np.abs(back - pts).max()))
+        rows.append(
+            {
+                "mode": mode,
+                "encoding": name,
+                "points": int(clouds[0].shape[0]),
+                "bytes": int(statistics.mean(sizes)),
+                "bytes_per_point": statistics.mean(sizes) / clouds[0].shape[0],
+                "kbit_per_s": statistics.mean(sizes) * 8 * fps / 1000.0,
+                "encode_ms": statistics.median(enc_ms),
+                "decode_ms": statistics.median(dec_ms),
+                "max_err_mm": err * 1e3,
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--modes", default=",".join(MODES))
+    ap.add_argument("--beams", type=int, default=16)
+    ap.add_argument("--frames", type=int, default=10)
+    ap.add_argument("--outdir", default="/home/kim/lidar-tas260226/data")
+    args = ap.parse_args()
+
+    rows = []
+    for mode in [m for m in args.modes.split(",") if m]:
+        rows += bench_mode(mode, args.beams, args.frames)
+
+    outdir = Path(args.outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    stem = f"point_codec_bench_{ts}"
+    out = {
+        "timestamp": ts,
+        "beams": args.beams,
+        "frames": args.frames,
+        "compressions": lidar_pointcodec.available_compressions(),
+        "rows": rows,
+    }
+    p_json = outdir / f"{stem}.json"
+    p_md = outdir / f"{stem}.md"
+    p_json.write_text(json.dumps(out, indent=2), encoding="ascii")
+
+    lines = [
+        "# Point Transport Encoding Benchmark",
+        "",
+        f"- scans: synthetic ground + 25 m wall + 3 walkers, `{args.beams}` beams, `{args.frames}` frames per mode",
+        "- bytes: mean packet size for all valid points of one frame (no LOD, no motion points)",
+        "- kbit/s: one client receiving every frame at the mode's frame rate",
+        "- encode/decode: median ms per frame, Python/NumPy on the server host",
+        f"- compressions available here: `{', '.join(out['compressions'])}`",
+        "",
+        "| mode | encoding | points | bytes | B/pt | vs f32 | kbit/s | encode ms | decode ms | max err mm |",
+        "|---|---|---:|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    base = {r["mode"]: r["bytes"] for r in rows if r["encoding"] == "f32"}
+    for r in rows:
+        lines.append(
+            f"| {r['mode']} | {r['encoding']} | {r['points']} | {r['bytes']} | {r['bytes_per_point']:.2f} | "
+            f"{r['bytes'] / base[r['mode']]:.2f} | {r['kbit_per_s']:.0f} | {r['encode_ms']:.2f} | {r['decode_ms']:.2f} | {r['max_err_mm']:.2f} |"
+        )
+    lines.append("")
+    p_md.write_text("\n".join(lines), encoding="ascii")
+    print("\n".join(lines))
+    print(p_json)
+    print(p_md)
+
+
+if __name__ == "__main__":
+    main()
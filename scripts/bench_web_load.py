@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""Ingest packet jitter vs concurrent HTTP clients: in-process endpoints vs the data-plane process.
+
+A sender process paces UDP packets at the lidar_mode's packet rate, each
+stamped with its send time. This process runs an ingest thread (recv loop,
+arrival times like the server's user-clock stamps) and a publisher that
+hands synthetic frames to the server's set_latest_frame / data-plane path.
+Client processes then load the point endpoints either from the same
+process (`inproc`, Flask threaded as with --data-port 0) or from the
+data-plane process reading shared memory (`shm`, the default server setup).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import socket
+import struct
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+
+import lidar_tas_server_v2 as server
+from bench_motion import RANGE_MAX_MM, RANGE_MIN_MM, synth_range_frames
+
+CLIENT_STEPS = [0, 1, 2, 5, 10, 20]
+CLIENT_PATHS = {"poll": "/api/points?max=32768", "stream": "/api/stream.bin?max=32768&enc=q16d&comp=deflate"}
+PKT = struct.Struct("<QQ")  # seq, send time (CLOCK_MONOTONIC ns)
+COLUMNS_PER_PACKET = 16
+
+
+def sender(port: int, pps: float, pkt_size: int, stop) -> None:
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    buf = bytearray(pkt_size)
+    period = 1.0 / pps
+    seq = 0
+    next_t = time.monotonic()
+    while not stop.is_set():
+        delay = next_t - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        PKT.pack_into(buf, 0, seq, time.monotonic_ns())
+        s.sendto(buf, ("127.0.0.1", port))
+        seq += 1
+        next_t += period
+
+
+def client(url: str, stats_url: str, kind: str, interval: float, stop, ready, served) -> None:
+    """One browser tab: poll `url` + stats, or read the push stream at `url`; counts bytes in `served`."""
+    sess = requests.Session()
+    first = True
+    while not stop.is_set():
+        try:
+            if kind == "stream":
+                with sess.get(url, stream=True, timeout=5) as r:
+                    for chunk in r.iter_content(65536):
+                        if first:
+                            first = False
+                            with ready.get_lock():
+                                ready.value += 1
+                        with served.get_lock():
+                            served.value += len(chunk)
+                        if stop.is_set():
+                            break
+                continue
+            n = len(sess.get(url, timeout=5).content)
+            n += len(sess.get(stats_url, timeout=5).content)
+            if first:
+                first = False
+                with ready.get_lock():
+                    ready.value += 1
+            with served.get_lock():
+                served.value += n
+        except requests.RequestException:
+            time.sleep(0.1)
+        time.sleep(interval)
+
+
+class Ingest:
+    """recv loop recording arrival and send times of every packet."""
+
+    def __init__(self, pkt_size: int, capacity: int) -> None:
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.5)
+        self.port = self.sock.getsockname()[1]
+        self.buf = bytearray(pkt_size)
+        self.recv_ns = np.zeros(capacity, dtype=np.int64)
+        self.send_ns = np.zeros(capacity, dtype=np.int64)
+        self.seq = np.zeros(capacity, dtype=np.int64)
+        self.n = 0
+        self.recording = False
+        self.stopped = False
+
+    def run(self) -> None:
+        while not self.stopped:
+            try:
+                self.sock.recv_into(self.buf)
+            except socket.timeout:
+                continue
+            t = time.monotonic_ns()
+            if self.recording and self.n < self.recv_ns.size:
+                seq, sent = PKT.unpack_from(self.buf)
+                self.recv_ns[self.n] = t
+                self.send_ns[self.n] = sent
+                self.seq[self.n] = seq
+                self.n += 1
+
+    def window(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        n = self.n
+        return self.recv_ns[:n].copy(), self.send_ns[:n].copy(), self.seq[:n].copy()
+
+
+def synth_clouds(beams: int, w: int, frames: int) -> list[tuple[np.ndarray, np.ndarray]]:
+    scans, (direction, offset) = synth_range_frames(beams, w, 3, frames)
+    out = []
+    for r in scans:
+        flat = r.reshape(-1)
+        idx = np.flatnonzero((flat > RANGE_MIN_MM) & (flat < RANGE_MAX_MM))
+        out.append((direction[idx] * flat[idx, None].astype(np.float32) + offset[idx], r))
+    return out
+
+
+def publisher(clouds, fps: float, stop: threading.Event) -> None:
+    """Stand-in for processing_thread's tail: one frame per scan period."""
+    fid = 0
+    next_t = time.monotonic()
+    while not stop.is_set():
+        next_t += 1.0 / fps
+        xyz, rng = clouds[fid % len(clouds)]
+        fid += 1
+        mpts = xyz[:200]
+        tracks = [{"id": 1, "centroid": [1.0, 2.0, 0.0], "speed_mps": 1.2, "age": fid}]
+        server.set_latest_frame(fid, xyz, mpts, tracks, rng, 1)
+        if server.data_plane is not None:
+            meta = json.dumps({"tracks": tracks, "stats": server.stats_snapshot()}, separators=(",", ":"))
+            server.data_plane.write(fid, xyz, mpts, rng, 1, meta.encode())
+        time.sleep(max(0.0, next_t - time.monotonic()))
+
+
+def measure(ingest: Ingest, base: str, n_clients: int, args) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    ready = ctx.Value("q", 0)
+    served = ctx.Value("q", 0)
+    url = base + (args.path or CLIENT_PATHS[args.client])
+    procs = [
+        ctx.Process(
+            target=client, args=(url, base + "/api/stats", args.client, args.client_interval, stop, ready, served)
+        )
+        for _ in range(n_clients)
+    ]
+    for p in procs:
+        p.start()
+    # Interpreter start-up of the clients is not web load; wait until every one got a response.
+    deadline = time.monotonic() + 120.0
+    while ready.value < n_clients and time.monotonic() < deadline:
+        time.sleep(0.1)
+    time.sleep(args.warmup)
+    with served.get_lock():
+        served.value = 0
+    ingest.n = 0
+    ingest.recording = True
+    time.sleep(args.seconds)
+    ingest.recording = False
+    with served.get_lock():
+        n_served = served.value
+    stop.set()
+    for p in procs:
+        p.join(5.0)
+        if p.is_alive():
+            p.terminate()
+
+    recv_ns, send_ns, seq = ingest.window()
+    gaps = server.gap_stats(recv_ns / 1e9)
+    lat = (recv_ns - send_ns) / 1e3
+    p50, p99 = np.percentile(lat, (50, 99)) if lat.size else (0.0, 0.0)
+    expected = int(seq[-1] - seq[0] + 1) if seq.size else 0
+    return {
+        "clients": n_clients,
+        "clients_ready": int(ready.value),
+        "served_mb_per_s": n_served / args.seconds / 1e6,
+        "packets": gaps["packets"],
+        "lost": expected - int(seq.size),
+        "pps": gaps["pps"],
+        "gap_mean_us": gaps["gap_mean_us"],
+        "gap_stdev_us": gaps["gap_stdev_us"],
+        "gap_p99_us": gaps["gap_p99_us"],
+        "gap_max_us": gaps["gap_max_us"],
+        "latency_p50_us": float(p50),
+        "latency_p99_us": float(p99),
+        "latency_max_us": float(lat.max()) if lat.size else 0.0,
+    }
+
+
+def run_mode(mode: str, ingest: Ingest, steps: list[int], args) -> list[dict]:
+    srv = proc = None
+    if mode == "inproc":
+        srv = make_server("127.0.0.1", args.http_port, server.app, threaded=True)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+    else:
+        proc = server.start_data_plane("127.0.0.1", args.http_port)
+    base = f"http://127.0.0.1:{args.http_port}"
+    for _ in range(100):
+        try:
+            requests.get(base + "/api/stats", timeout=1)
+            break
+        except requests.RequestException:
+            time.sleep(0.1)
+    time.sleep(args.settle)
+
+    rows = []
+    try:
+        for n in steps:
+            row = {"mode": mode, **measure(ingest, base, n, args)}
+            print(
+                f"{mode:6s} clients={n:2d} served={row['served_mb_per_s']:6.1f}MB/s "
+                f"gap_stdev={row['gap_stdev_us']:7.1f}us lat_p99={row['latency_p99_us']:8.1f}us lost={row['lost']}"
+            )
+            rows.append(row)
+    finally:
+        if srv is not None:
+            srv.shutdown()
+        server.stop_data_plane(proc)
+        # Handler threads of the last step may still be encoding; keep them out of the next mode.
+        time.sleep(args.settle)
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--lidar-mode", default="1024x20", help="sets packet rate (16 columns per packet) and frame rate")
+    ap.add_argument("--beams", type=int, default=128)
+    ap.add_argument("--pkt-size", type=int, default=24896)
+    ap.add_argument("--modes", default="inproc,shm")
+    ap.add_argument("--clients", default=",".join(str(n) for n in CLIENT_STEPS))
+    ap.add_argument("--client", choices=["poll", "stream"], default="poll")
+    ap.add_argument("--path", default="", help=f"endpoint the clients load (default per --client: {CLIENT_PATHS})")
+    ap.add_argument("--client-interval", type=float, default=0.25, help="seconds between a poll client's requests")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--warmup", type=float, default=2.0)
+    ap.add_argument("--settle", type=float, default=5.0, help="idle seconds after starting/stopping a server")
+    ap.add_argument("--http-port", type=int, default=18082)
+    ap.add_argument("--outdir", default="/home/kim/lidar-tas260226/data")
+    args = ap.parse_args()
+
+    w, fps = (int(v) for v in args.lidar_mode.split("x"))
+    pps = w / COLUMNS_PER_PACKET * fps
+    steps = [int(n) for n in args.clients.split(",") if n]
+    ingest = Ingest(args.pkt_size, int(pps * args.seconds * 1.5) + 1000)
+    threading.Thread(target=ingest.run, daemon=True).start()
+    pub_stop = threading.Event()
+    threading.Thread(target=publisher, args=(synth_clouds(args.beams, w, 8), fps, pub_stop), daemon=True).start()
+    ctx = multiprocessing.get_context("spawn")
+    send_stop = ctx.Event()
+    send_proc = ctx.Process(target=sender, args=(ingest.port, pps, args.pkt_size, send_stop), daemon=True)
+    send_proc.start()
+
+    rows = []
+    try:
+        for mode in [m for m in args.modes.split(",") if m]:
+            rows += run_mode(mode, ingest, steps, args)
+    finally:
+        send_stop.set()
+        pub_stop.set()
+        ingest.stopped = True
+        send_proc.join(2.0)
+
+    outdir = Path(args.outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    stem = f"web_load_bench_{ts}"
+    out = {
+        "timestamp": ts,
+        "lidar_mode": args.lidar_mode,
+        "beams": args.beams,
+        "pps": pps,
+        "pkt_size": args.pkt_size,
+        "client": args.client,
+        "client_interval_s": args.client_interval,
+        "path": args.path or CLIENT_PATHS[args.client],
+        "seconds": args.seconds,
+        "cpus": multiprocessing.cpu_count(),
+        "rows": rows,
+    }
+    p_json = outdir / f"{stem}.json"
+    p_md = outdir / f"{stem}.md"
+    p_json.write_text(json.dumps(out, indent=2), encoding="ascii")
+
+    lines = [
+        "# Web Load vs Ingest Jitter Benchmark",
+        "",
+        f"- packets: `{pps:.0f}` pps of `{args.pkt_size}` B over loopback ({args.lidar_mode} packet rate), "
+        f"frames: `{args.beams}` x `{w}` synthetic scans at `{fps}` Hz",
+        f"- clients: `{args.client}` `{out['path']}`"
+        + (f" + `/api/stats` every `{args.client_interval}` s" if args.client == "poll" else "")
+        + f", one process each, `{args.seconds}` s per step after all clients got a response",
+        "- inproc: endpoints served by Flask threads in the ingest process (`--data-port 0`)",
+        "- shm: endpoints served by the data-plane process from shared memory (`--data-port`)",
+        "- gap: inter-arrival time seen by the ingest thread (user clock), includes the sender's pacing jitter",
+        "- latency: sender stamp -> recv return in the ingest thread, i.e. how long packets waited for ingest",
+        "- responding: clients that got a response within 120 s of starting",
+        f"- host CPUs: `{out['cpus']}`",
+    ]
+    if out["cpus"] < 2:
+        lines.append(
+            "- note: with one CPU the data-plane process time-shares the ingest core; shm rows separate the GIL, "
+            "not the CPU, so rerun on a multi-core host before reading them as ingest isolation"
+        )
+    lines += [
+        "",
+        "| mode | clients | responding | served MB/s | pps | gap mean us | gap stdev us | gap p99 us | gap max us | lat p50 us | lat p99 us | lat max us | lost |",
+        "|---|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    for r in rows:
+        lines.append(
+            f"| {r['mode']} | {r['clients']} | {r['clients_ready']} | {r['served_mb_per_s']:.1f} | {r['pps']:.0f} | {r['gap_mean_us']:.1f} | "
+            f"{r['gap_stdev_us']:.1f} | {r['gap_p99_us']:.1f} | {r['gap_max_us']:.0f} | {r['latency_p50_us']:.0f} | "
+            f"{r['latency_p99_us']:.0f} | {r['latency_max_us']:.0f} | {r['lost']} |"
+        )
+    lines.append("")
+    p_md.write_text("\n".join(lines), encoding="ascii")
+    print("\n".join(lines))
+    print(p_json)
+    print(p_md)
+
+
+if __name__ == "__main__":
+    main()
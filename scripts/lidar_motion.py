@@ -0,0 +1,709 @@
+#!/usr/bin/env python3
+"""Voxel background subtraction and motion clustering on packed int64 keys.
+
+A voxel (x, y, z) is packed into one int64 with 21 bits per axis, offset by
+2^20 so negative coordinates stay positive: x in bits 42..62, y in 21..41,
+z in 0..20. Sets of voxels then become sorted int64 arrays, so membership
+and grouping are NumPy searchsorted/unique calls instead of Python tuples.
+Moving the key by +-1, +-2^21 or +-2^42 steps one voxel along z, y or x.
+"""
+
+from __future__ import annotations
+
+import glob
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+KEY_BITS = 21
+KEY_OFFSET = 1 << (KEY_BITS - 1)
+KEY_MASK = (1 << KEY_BITS) - 1
+# 6-neighbour steps in key space: +-z, +-y, +-x.
+NEIGHBOR_STEPS = (1, -1, 1 << KEY_BITS, -(1 << KEY_BITS), 1 << (2 * KEY_BITS), -(1 << (2 * KEY_BITS)))
+
+MAX_TRACKS = 5
+MIN_TRACK_POINTS = 12
+
+
+def voxelize(points: np.ndarray, voxel_m: float) -> np.ndarray:
+    if points.size == 0:
+        return np.empty((0, 3), dtype=np.int32)
+    return np.floor(points / voxel_m).astype(np.int32)
+
+
+def pack_voxel_keys(vox: np.ndarray) -> np.ndarray:
+    v = vox.astype(np.int64) + KEY_OFFSET
+    return (v[:, 0] << (2 * KEY_BITS)) | (v[:, 1] << KEY_BITS) | v[:, 2]
+
+
+def unpack_voxel_keys(keys: np.ndarray) -> np.ndarray:
+    out = np.empty((keys.size, 3), dtype=np.int32)
+    out[:, 0] = ((keys >> (2 * KEY_BITS)) & KEY_MASK) - KEY_OFFSET
+    out[:, 1] = ((keys >> KEY_BITS) & KEY_MASK) - KEY_OFFSET
+    out[:, 2] = (keys & KEY_MASK) - KEY_OFFSET
+    return out
+
+
+def voxel_keys(points: np.ndarray, voxel_m: float) -> np.ndarray:
+    return pack_voxel_keys(voxelize(points, voxel_m))
+
+
+def rescale_voxel_keys(keys: np.ndarray, from_m: float, to_m: float) -> np.ndarray:
+    """Sorted unique keys at `to_m` covering the `from_m` voxels in `keys`.
+
+    The sizes must differ by an integer factor (as DECIMATION_LEVELS do), so
+    voxel edges line up: coarser keys are floor-divided, finer keys expand
+    to every child voxel.
+    """
+    vox = unpack_voxel_keys(keys).astype(np.int64)
+    if to_m >= from_m:
+        vox //= round(to_m / from_m)
+    else:
+        r = round(from_m / to_m)
+        child = np.stack(np.meshgrid(*[np.arange(r)] * 3, indexing="ij"), axis=-1).reshape(-1, 3)
+        vox = (vox[:, None, :] * r + child).reshape(-1, 3)
+    return np.unique(pack_voxel_keys(vox))
+
+
+def in_sorted(keys: np.ndarray, sorted_keys: np.ndarray) -> np.ndarray:
+    """Boolean mask of `keys` present in the sorted unique array `sorted_keys`."""
+    if sorted_keys.size == 0:
+        return np.zeros(keys.shape, dtype=bool)
+    idx = np.searchsorted(sorted_keys, keys)
+    idx[idx == sorted_keys.size] = 0
+    return sorted_keys[idx] == keys
+
+
+def background_from_history(history: Sequence[np.ndarray], min_hits: int) -> np.ndarray:
+    """Sorted keys seen in at least `min_hits` of the per-frame unique key arrays."""
+    if not history:
+        return np.empty(0, dtype=np.int64)
+    keys, counts = np.unique(np.concatenate(list(history)), return_counts=True)
+    return keys[counts >= min_hits]
+
+
+def _neighbor_edges(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Index pairs (i, j) of sorted unique keys that are 6-neighbours, each pair once."""
+    src = []
+    dst = []
+    for step in NEIGHBOR_STEPS[::2]:
+        nb = keys + step
+        j = np.searchsorted(keys, nb)
+        j[j == keys.size] = 0
+        hit = np.flatnonzero(keys[j] == nb)
+        src.append(hit)
+        dst.append(j[hit])
+    return np.concatenate(src), np.concatenate(dst)
+
+
+def ranked_components(n: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Connected-component label per node 0..n-1 given undirected edges (a[i], b[i]).
+
+    Union-find in bulk: every round hooks the larger root of each edge onto
+    the smaller one, then pointer-jumps until every node points at its
+    root, so the number of rounds grows with log(component size) rather
+    than one Python step per node. Roots end up as each component's
+    smallest node index.
+
+    Labels are ranked by component size, largest first; equal sizes keep
+    the order of their smallest node.
+    """
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    parent = np.arange(n, dtype=np.int64)
+    while a.size:
+        ra = parent[a]
+        rb = parent[b]
+        live = ra != rb
+        if not live.any():
+            break
+        a, b, ra, rb = a[live], b[live], ra[live], rb[live]
+        np.minimum.at(parent, np.maximum(ra, rb), np.minimum(ra, rb))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+    roots, comp, sizes = np.unique(parent, return_inverse=True, return_counts=True)
+    order = np.argsort(-sizes, kind="stable")
+    rank = np.empty(roots.size, dtype=np.int64)
+    rank[order] = np.arange(roots.size)
+    return rank[comp.reshape(-1)]
+
+
+def label_voxel_clusters(keys: np.ndarray) -> np.ndarray:
+    """6-connected components over sorted unique voxel keys, ranked by voxel count."""
+    a, b = _neighbor_edges(keys)
+    return ranked_components(keys.size, a, b)
+
+
+def point_cluster_ids(keys: np.ndarray, bg_keys: np.ndarray) -> tuple[np.ndarray, int]:
+    """Per-point cluster id (size rank, -1 for background) and the cluster count."""
+    ukeys, inverse = np.unique(keys, return_inverse=True)
+    moving = ~in_sorted(ukeys, bg_keys)
+    if not moving.any():
+        return np.full(keys.size, -1, dtype=np.int64), 0
+    vox_label = np.full(ukeys.size, -1, dtype=np.int64)
+    labels = label_voxel_clusters(ukeys[moving])
+    vox_label[moving] = labels
+    return vox_label[inverse.reshape(-1)], int(labels.max()) + 1
+
+
+def motion_clusters(
+    points: np.ndarray,
+    keys: np.ndarray,
+    bg_keys: np.ndarray,
+    max_tracks: int = MAX_TRACKS,
+    min_points: int = MIN_TRACK_POINTS,
+) -> tuple[np.ndarray, list[dict]]:
+    """Points outside the background, clustered by voxel adjacency.
+
+    The `max_tracks` largest clusters (by voxel count) are considered and
+    those with fewer than `min_points` points are dropped; track ids are
+    the 1-based size rank, so a dropped cluster leaves a gap in the ids.
+    """
+    if keys.size == 0:
+        return np.empty((0, 3), dtype=np.float32), []
+    point_label, n_clusters = point_cluster_ids(keys, bg_keys)
+    return top_clusters(points, point_label, n_clusters, max_tracks, min_points)
+
+
+def top_clusters(
+    points: np.ndarray,
+    point_label: np.ndarray,
+    n_clusters: int,
+    max_tracks: int = MAX_TRACKS,
+    min_points: int = MIN_TRACK_POINTS,
+) -> tuple[np.ndarray, list[dict]]:
+    """Moving points and track dicts for the `max_tracks` best-ranked clusters.
+
+    `point_label` is the size rank per point (-1 = not moving). Clusters
+    with fewer than `min_points` points are dropped but keep their id slot.
+    """
+    empty = np.empty((0, 3), dtype=np.float32)
+    k = min(max_tracks, n_clusters)
+    if k == 0:
+        return empty, []
+
+    top = np.flatnonzero((point_label >= 0) & (point_label < k))
+    lab = point_label[top]
+    counts = np.bincount(lab, minlength=k)
+    sums = np.stack([np.bincount(lab, weights=points[top, c], minlength=k) for c in range(3)], axis=1)
+    kept = np.flatnonzero(counts >= min_points)
+    if kept.size == 0:
+        return empty, []
+
+    tracks = []
+    for cid in kept.tolist():
+        center = sums[cid] / counts[cid]
+        tracks.append(
+            {
+                "id": cid + 1,
+                "points": int(counts[cid]),
+                "centroid": [float(center[0]), float(center[1]), float(center[2])],
+            }
+        )
+    sel = top[counts[lab] >= min_points]
+    sel = sel[np.argsort(point_label[sel], kind="stable")]
+    return points[sel].astype(np.float32, copy=False), tracks
+
+
+def roi_boxes(boxes: Sequence[dict]) -> np.ndarray:
+    """Validate [{"min": [x, y, z], "max": [x, y, z]}, ...] into a (k, 2, 3) float32 array."""
+    out = np.empty((len(boxes), 2, 3), dtype=np.float32)
+    for i, box in enumerate(boxes):
+        lo = np.asarray(box["min"], dtype=np.float32)
+        hi = np.asarray(box["max"], dtype=np.float32)
+        if lo.shape != (3,) or hi.shape != (3,):
+            raise ValueError("ROI box min/max must be [x, y, z]")
+        if np.any(lo > hi):
+            raise ValueError("ROI box min must be <= max")
+        out[i, 0], out[i, 1] = lo, hi
+    return out
+
+
+def roi_mask(points: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """True for points inside any box of `boxes` (k, 2, 3); all True when k == 0."""
+    if boxes.shape[0] == 0:
+        return np.ones(points.shape[0], dtype=bool)
+    mask = np.zeros(points.shape[0], dtype=bool)
+    for lo, hi in boxes:
+        mask |= np.all((points >= lo) & (points <= hi), axis=1)
+    return mask
+
+
+# (voxel scale, point stride) per decimation level, cheapest last. Strides
+# come first because they keep the voxel grid, and with it the background.
+DECIMATION_LEVELS = ((1.0, 1), (1.0, 2), (1.0, 4), (2.0, 4), (2.0, 8))
+
+
+class DecimationController:
+    """Pick a decimation level so motion processing stays within `budget_ms`.
+
+    `observe` takes the last frame's motion time. Going over budget steps
+    one level up right away; stepping down needs `calm_frames` frames in a
+    row under `low_water` x budget, so the level does not flap.
+    """
+
+    def __init__(
+        self,
+        budget_ms: float = 50.0,
+        levels: Sequence[tuple[float, int]] = DECIMATION_LEVELS,
+        low_water: float = 0.5,
+        calm_frames: int = 20,
+    ) -> None:
+        self.budget_ms = budget_ms
+        self.levels = tuple(levels)
+        self.low_water = low_water
+        self.calm_frames = calm_frames
+        self.level = 0
+        self._calm = 0
+
+    @property
+    def voxel_scale(self) -> float:
+        return self.levels[self.level][0]
+
+    @property
+    def stride(self) -> int:
+        return self.levels[self.level][1]
+
+    def observe(self, ms: float) -> int:
+        if ms > self.budget_ms and self.level < len(self.levels) - 1:
+            self.level += 1
+            self._calm = 0
+        elif ms < self.low_water * self.budget_ms and self.level > 0:
+            self._calm += 1
+            if self._calm >= self.calm_frames:
+                self.level -= 1
+                self._calm = 0
+        else:
+            self._calm = 0
+        return self.level
+
+    def reset(self) -> None:
+        self.level = 0
+        self._calm = 0
+
+
+_EMPTY = -1
+_HASH_MUL = np.uint64(0x9E3779B97F4A7C15)
+
+
+class DecayingBackground:
+    """Online per-voxel background model with a hard memory cap.
+
+    Each voxel keeps an exponentially decayed hit score s = d*s + hit with
+    d = 1 - 1/horizon_frames, stored lazily (score, last frame) so a frame
+    only touches the voxels it hits. Occupancy is the score divided by what
+    a voxel hit every frame since the last reset would have, so it lies in
+    [0, 1] from the first frame on and there is no warm-up blackout. A
+    voxel is background when its occupancy is >= `occupancy`; something
+    that stops moving is absorbed after about horizon_frames * -ln(1 -
+    occupancy) frames.
+
+    Storage is an open-addressing (linear probing) hash table of packed
+    voxel keys sized for `max_voxels` at <= 50% load. When it fills up the
+    least recently hit quarter is evicted by rebuilding the table (never
+    more per frame); new keys that still do not fit are left out of that
+    frame and count as foreground.
+    """
+
+    def __init__(self, max_voxels: int = 200_000, horizon_frames: int = 300, occupancy: float = 0.7) -> None:
+        self.max_voxels = max(16, max_voxels)
+        self.horizon_frames = max(2, horizon_frames)
+        self.occupancy = occupancy
+        self.decay = 1.0 - 1.0 / self.horizon_frames
+        self._log_decay = np.float32(np.log(self.decay))
+        bits = max(5, (2 * self.max_voxels - 1).bit_length())
+        self._bits = bits
+        self._mask = (1 << bits) - 1
+        self._keys = np.full(1 << bits, _EMPTY, dtype=np.int64)
+        self._score = np.zeros(1 << bits, dtype=np.float32)
+        self._last = np.zeros(1 << bits, dtype=np.int32)
+        self.size = 0
+        self.frame = 0
+        self.evictions = 0
+        # Keys left out of the table because one frame brought more new
+        # voxels than max_voxels could hold.
+        self.overflow = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._keys.nbytes + self._score.nbytes + self._last.nbytes
+
+    def reset(self) -> None:
+        self._keys.fill(_EMPTY)
+        self.size = 0
+        self.frame = 0
+
+    def _hash(self, keys: np.ndarray) -> np.ndarray:
+        return ((keys.astype(np.uint64) * _HASH_MUL) >> np.uint64(64 - self._bits)).astype(np.int64)
+
+    def _slots(self, keys: np.ndarray, insert: bool) -> np.ndarray:
+        """Table slot of each unique key (-1 if absent); inserts missing keys if asked."""
+        slot = self._hash(keys)
+        out = np.full(keys.size, -1, dtype=np.int64)
+        pending = np.arange(keys.size)
+        while pending.size:
+            s = slot[pending]
+            tk = self._keys[s]
+            found = tk == keys[pending]
+            empty = tk == _EMPTY
+            out[pending[found]] = s[found]
+            done = found.copy()
+            if insert and empty.any():
+                # Several keys may probe the same empty slot; the first claims
+                # it and the rest see an occupied slot on the next round.
+                cand = np.flatnonzero(empty)
+                _, first = np.unique(s[cand], return_index=True)
+                win = cand[first]
+                self._keys[s[win]] = keys[pending[win]]
+                self._score[s[win]] = 0.0
+                self._last[s[win]] = self.frame
+                self.size += win.size
+                out[pending[win]] = s[win]
+                done[win] = True
+            elif not insert:
+                done |= empty
+            step = ~done & ~empty
+            slot[pending[step]] = (s[step] + 1) & self._mask
+            pending = pending[~done]
+        return out
+
+    def _norm(self) -> float:
+        # Score of a voxel hit on every frame since the last reset.
+        return (1.0 - self.decay**self.frame) / (1.0 - self.decay)
+
+    def update(self, keys: np.ndarray) -> np.ndarray:
+        """Add one frame of unique voxel keys; returns the background mask for them."""
+        self.frame += 1
+        slots = self._slots(keys, insert=False)
+        new = np.flatnonzero(slots < 0)
+        if self.size + new.size > self.max_voxels:
+            # Make room for at most a quarter of the table per frame, so a scene
+            # change or sensor bump cannot flush the established background at once.
+            self._evict(min(new.size, self.max_voxels // 4))
+            slots = self._slots(keys, insert=False)
+            new = np.flatnonzero(slots < 0)
+        # Never insert past max_voxels: the table stays <= 50% full, so every
+        # probe sequence ends. Keys that do not fit stay unmodelled (foreground).
+        room = self.max_voxels - self.size
+        if new.size > room:
+            self.overflow += new.size - room
+            new = new[:room]
+        if new.size:
+            slots[new] = self._slots(keys[new], insert=True)
+        hit = slots >= 0
+        s = slots[hit]
+        age = (self.frame - self._last[s]).astype(np.float32)
+        score = self._score[s] * np.exp(age * self._log_decay) + 1.0
+        self._score[s] = score
+        self._last[s] = self.frame
+        bg = np.zeros(keys.size, dtype=bool)
+        bg[hit] = score >= self.occupancy * self._norm()
+        return bg
+
+    def occupancy_of(self, keys: np.ndarray) -> np.ndarray:
+        slots = self._slots(keys, insert=False)
+        occ = np.zeros(keys.size, dtype=np.float32)
+        hit = slots >= 0
+        if self.frame and hit.any():
+            s = slots[hit]
+            age = (self.frame - self._last[s]).astype(np.float32)
+            occ[hit] = self._score[s] * np.exp(age * self._log_decay) / self._norm()
+        return occ
+
+    STATE_DTYPE = np.dtype([("key", "<i8"), ("score", "<f4"), ("age", "<i4")])
+
+    def export_state(self) -> np.ndarray:
+        """Live voxels as a compact structured array; age is frames since the last hit."""
+        used = np.flatnonzero(self._keys != _EMPTY)
+        out = np.empty(used.size, dtype=self.STATE_DTYPE)
+        out["key"] = self._keys[used]
+        out["score"] = self._score[used]
+        out["age"] = self.frame - self._last[used]
+        return out
+
+    def load_state(self, state: np.ndarray, frame: int) -> None:
+        """Replace the table with an `export_state` snapshot taken at `frame`."""
+        self.reset()
+        self.frame = int(frame)
+        if state.size > self.max_voxels:
+            state = state[np.argsort(state["age"], kind="stable")[: self.max_voxels]]
+        slots = self._slots(np.ascontiguousarray(state["key"]), insert=True)
+        self._score[slots] = state["score"]
+        self._last[slots] = self.frame - state["age"]
+
+    def _evict(self, incoming: int) -> None:
+        """Rebuild keeping the most recently hit voxels, leaving room for `incoming`."""
+        used = np.flatnonzero(self._keys != _EMPTY)
+        keep_n = max(0, min(used.size, self.max_voxels * 3 // 4, self.max_voxels - incoming))
+        keep = used[np.argsort(-self._last[used], kind="stable")[:keep_n]]
+        keys = self._keys[keep]
+        score = self._score[keep]
+        last = self._last[keep]
+        self.evictions += used.size - keep_n
+        self._keys.fill(_EMPTY)
+        self.size = 0
+        slots = self._slots(keys, insert=True)
+        self._score[slots] = score
+        self._last[slots] = last
+
+
+def destagger_index(h: int, w: int, pixel_shift_by_row: Sequence[int]) -> np.ndarray:
+    """Flat staggered index for every destaggered (h, w) pixel, row-major.
+
+    Same convention as ouster.sdk destagger: row r is rolled right by
+    pixel_shift_by_row[r], so destaggered[r, c] = staggered[r, c - shift[r]].
+    """
+    shift = np.asarray(pixel_shift_by_row, dtype=np.int64).reshape(h, 1)
+    cols = (np.arange(w, dtype=np.int64)[None, :] - shift) % w
+    return (np.arange(h, dtype=np.int64)[:, None] * w + cols).reshape(-1)
+
+
+class RangeImageMotion:
+    """Motion segmentation on the destaggered h x w range image.
+
+    The background is a per-pixel frugal running median of range: every
+    frame it moves towards the new range by at most step = bg/horizon +
+    step_mm, so passing objects barely bias it while static changes are
+    absorbed within roughly horizon_frames. Pixels without a valid return
+    count as `far_mm`. A pixel is foreground when it returns closer than
+    the background by more than max(threshold_mm, threshold_rel * bg).
+
+    Foreground pixels are clustered with 4-neighbour connected components
+    (wrapping in azimuth) where neighbours must also be within join_mm of
+    each other, and only pixels of the kept clusters are projected to XYZ.
+    Every step is a fixed number of vectorized passes over h*w pixels.
+    The first frame seeds the background, so there is no warm-up blackout.
+    """
+
+    def __init__(
+        self,
+        h: int,
+        w: int,
+        pixel_shift_by_row: Sequence[int],
+        lut: tuple[np.ndarray, np.ndarray],
+        min_mm: float,
+        max_mm: float,
+        horizon_frames: int = 300,
+        threshold_mm: float = 300.0,
+        threshold_rel: float = 0.05,
+        join_mm: float = 500.0,
+        step_mm: float = 5.0,
+    ) -> None:
+        self.h = h
+        self.w = w
+        self.lut = lut
+        self._src = destagger_index(h, w, pixel_shift_by_row)
+        self._direction = lut[0][self._src]
+        self._offset = lut[1][self._src]
+        self.min_mm = min_mm
+        self.max_mm = max_mm
+        self.far_mm = float(max_mm)
+        self.horizon_frames = max(2, horizon_frames)
+        self.threshold_mm = threshold_mm
+        self.threshold_rel = threshold_rel
+        self.join_mm = join_mm
+        self.step_mm = step_mm
+        self.bg = None
+        self.foreground_pixels = 0
+
+    def reset(self) -> None:
+        self.bg = None
+
+    def _edges(self, fg: np.ndarray, rng: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        img = fg.reshape(self.h, self.w)
+        r = rng.reshape(self.h, self.w)
+        idx = np.arange(self.h * self.w, dtype=np.int64).reshape(self.h, self.w)
+        right_r = np.roll(r, -1, axis=1)
+        horiz = img & np.roll(img, -1, axis=1) & (np.abs(r - right_r) < self.join_mm)
+        vert = img[:-1] & img[1:] & (np.abs(r[:-1] - r[1:]) < self.join_mm)
+        a = np.concatenate([idx[horiz], idx[:-1][vert]])
+        b = np.concatenate([np.roll(idx, -1, axis=1)[horiz], idx[1:][vert]])
+        return a, b
+
+    def update(
+        self,
+        range_mm: np.ndarray,
+        max_tracks: int = MAX_TRACKS,
+        min_points: int = MIN_TRACK_POINTS,
+        roi: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, list[dict]]:
+        """Feed one staggered RANGE field (any shape, h*w values); returns moving points and tracks.
+
+        With `roi` boxes (see roi_boxes) foreground pixels outside every box
+        are dropped before clustering; the background still updates everywhere.
+        """
+        rng = range_mm.reshape(-1)[self._src].astype(np.float32)
+        valid = (rng > self.min_mm) & (rng < self.max_mm)
+        rng[~valid] = self.far_mm
+        if self.bg is None:
+            self.bg = rng.copy()
+            self.foreground_pixels = 0
+            return np.empty((0, 3), dtype=np.float32), []
+
+        bg = self.bg
+        fg = valid & (rng < bg - np.maximum(self.threshold_mm, self.threshold_rel * bg))
+        step = bg * (1.0 / self.horizon_frames) + self.step_mm
+        bg += np.clip(rng - bg, -step, step)
+        if roi is not None and roi.shape[0]:
+            pix = np.flatnonzero(fg)
+            xyz = self._direction[pix] * rng[pix, None] + self._offset[pix]
+            fg[pix[~roi_mask(xyz, roi)]] = False
+        self.foreground_pixels = int(np.count_nonzero(fg))
+        if not self.foreground_pixels:
+            return np.empty((0, 3), dtype=np.float32), []
+
+        a, b = self._edges(fg, rng)
+        pix = np.flatnonzero(fg)
+        compact = np.full(fg.size, -1, dtype=np.int64)
+        compact[pix] = np.arange(pix.size)
+        labels = ranked_components(pix.size, compact[a], compact[b])
+
+        # Project only pixels of clusters that can still become tracks.
+        keep = labels < max_tracks
+        pix = pix[keep]
+        labels = labels[keep]
+        xyz = self._direction[pix] * rng[pix, None] + self._offset[pix]
+        return top_clusters(xyz, labels, int(labels.max()) + 1 if labels.size else 0, max_tracks, min_points)
+
+
+class BackgroundStore:
+    """Background snapshots on disk as memory-mapped .npy files plus a .json sidecar.
+
+    `submit` only queues a copy; a daemon thread writes it through
+    np.lib.format.open_memmap into a temp file and renames it into place,
+    so callers never wait on disk and readers never see a partial file.
+    Only the newest pending snapshot per name is kept.
+
+    Reads stay off the caller's thread too: `prefetch` queues every snapshot
+    whose name starts with a prefix for the same thread to load, and `load`
+    only answers from memory (prefetched or submitted snapshots, newest
+    `cache_size` kept). Raises OSError if `root` cannot be created.
+    """
+
+    def __init__(self, root: str, cache_size: int = 16) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.writes = 0
+        self.errors = 0
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._prefetch = []
+        self._busy = False
+        self._loading = False
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    @staticmethod
+    def _safe(name: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_.-]+", "-", name)
+
+    def path(self, name: str) -> Path:
+        return self.root / f"{self._safe(name)}.npy"
+
+    def submit(self, name: str, array: np.ndarray, meta: dict) -> None:
+        with self._cond:
+            self._pending[name] = (array, meta)
+            self._remember(self._safe(name), (array, meta))
+            self._cond.notify()
+
+    def prefetch(self, prefix: str) -> None:
+        """Load every snapshot named `prefix`* into memory on the writer thread."""
+        with self._cond:
+            self._prefetch.append(self._safe(prefix))
+            self._cond.notify()
+
+    def prefetching(self) -> bool:
+        """True while a prefetch is queued or still loading, so a `load` miss may yet be filled."""
+        with self._cond:
+            return bool(self._prefetch) or self._loading
+
+    def load(self, name: str) -> tuple[np.ndarray, dict] | None:
+        """Cached snapshot for `name`, or None; never touches the disk. Treat the array as read-only."""
+        with self._cond:
+            return self._cache.get(self._safe(name))
+
+    def _remember(self, name: str, snap: tuple[np.ndarray, dict]) -> None:
+        self._cache[name] = snap
+        self._cache.move_to_end(name)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _read(self, path: Path) -> tuple[np.ndarray, dict] | None:
+        try:
+            meta = json.loads(path.with_suffix(".json").read_text(encoding="ascii"))
+            return np.load(path), meta
+        except (OSError, ValueError):
+            return None
+
+    def _load_prefix(self, prefix: str) -> None:
+        try:
+            paths = sorted(self.root.glob(f"{glob.escape(prefix)}*.npy"))
+        except OSError:
+            return
+        for path in paths:
+            name = path.stem
+            with self._cond:
+                if name in self._cache:
+                    continue
+            snap = self._read(path)
+            if snap is not None:
+                with self._cond:
+                    # A snapshot submitted meanwhile is newer than the file.
+                    if name not in self._cache:
+                        self._remember(name, snap)
+
+    def flush(self, timeout: float) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._prefetch and not self._busy, timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._prefetch)
+                # Writes first: a prefetch never delays a snapshot reaching disk.
+                prefix = None if self._pending else self._prefetch.pop(0)
+                if prefix is None:
+                    name, (array, meta) = self._pending.popitem()
+                self._busy = True
+                self._loading = prefix is not None
+            if prefix is not None:
+                self._load_prefix(prefix)
+                with self._cond:
+                    self._busy = self._loading = False
+                    self._cond.notify_all()
+                continue
+            try:
+                self._write(name, array, meta)
+                self.writes += 1
+            except OSError as e:
+                self.errors += 1
+                print(f"background snapshot {name} failed: {e}")
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def _write(self, name: str, array: np.ndarray, meta: dict) -> None:
+        path = self.path(name)
+        tmp = path.with_suffix(".npy.tmp")
+        if array.size:
+            mm = np.lib.format.open_memmap(tmp, mode="w+", dtype=array.dtype, shape=array.shape)
+            mm[...] = array
+            mm.flush()
+            del mm
+        else:
+            with tmp.open("wb") as f:
+                np.save(f, array)
+        os.replace(tmp, path)
+        meta_tmp = path.with_suffix(".json.tmp")
+        meta_tmp.write_text(json.dumps(meta), encoding="ascii")
+        os.replace(meta_tmp, path.with_suffix(".json"))
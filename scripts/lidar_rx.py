@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""LiDAR UDP receive helpers shared by the server and capture scripts."""
+
+from __future__ import annotations
+
+import ctypes
+import errno
+import fcntl
+import os
+import select
+import socket
+import struct
+import sys
+import time
+from collections import Counter
+from typing import Callable, Sequence
+
+
+class PacketPool:
+    """Small free-list of preallocated packet buffers for recv_into ingest.
+
+    `allocs` counts every buffer the pool has ever created. After the initial
+    fill it only grows when more than `depth` packets are held at once, so a
+    flat `allocs` across frames shows no packet buffers are created in steady
+    state. It says nothing about other Python objects: each recv still
+    allocates its result tuple, ints and ancillary data.
+    """
+
+    def __init__(self, factory: Callable[[], object], depth: int = 4) -> None:
+        if depth < 1:
+            raise ValueError("depth must be >= 1")
+        self._factory = factory
+        self._free = [factory() for _ in range(depth)]
+        self.depth = depth
+        self.allocs = depth
+
+    def acquire(self):
+        if self._free:
+            return self._free.pop()
+        self.allocs += 1
+        return self._factory()
+
+    def release(self, pkt) -> None:
+        self._free.append(pkt)
+
+
+def recv_into_checked(sock: socket.socket, buf) -> int:
+    """recv_into `buf` and return the real datagram length.
+
+    MSG_TRUNC makes Linux report the full datagram size even when it did not
+    fit, so oversized packets can be rejected instead of silently truncated.
+    """
+    return sock.recv_into(buf, 0, socket.MSG_TRUNC)
+
+
+# Linux socket constants not exported by the socket module.
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+SO_TIMESTAMPING = getattr(socket, "SO_TIMESTAMPING", 37)
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40)
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0x40)
+MSG_TRUNC = getattr(socket, "MSG_TRUNC", 0x20)
+
+# linux/net_tstamp.h
+SOF_TIMESTAMPING_RX_HARDWARE = 1 << 2
+SOF_TIMESTAMPING_RX_SOFTWARE = 1 << 3
+SOF_TIMESTAMPING_SOFTWARE = 1 << 4
+SOF_TIMESTAMPING_RAW_HARDWARE = 1 << 6
+SIOCSHWTSTAMP = 0x89B0
+HWTSTAMP_TX_OFF = 0
+HWTSTAMP_FILTER_ALL = 1
+
+# Receive timestamp modes, from least to most accurate:
+#   user   - CLOCK_REALTIME read in Python after recv returns (GIL/scheduler
+#            jitter); same clock as kernel stamps, so fallbacks line up
+#   kernel - SO_TIMESTAMPNS, stamped by the kernel when the skb was received
+#   hw     - SO_TIMESTAMPING raw hardware stamp from the NIC (PHC clock); a
+#            packet without one reports its kernel software stamp instead,
+#            tagged "kernel", so callers can keep one clock per run
+TIMESTAMP_MODES = ["user", "kernel", "hw"]
+
+_CMSG_HDR = struct.Struct("@Nii")
+_CMSG_ALIGN = ctypes.sizeof(ctypes.c_size_t)
+_TIMESPEC = struct.Struct("@qq")
+_SCM_TIMESTAMPING = struct.Struct("@qqqqqq")
+_U32 = struct.Struct("@I")
+# Room for one SCM_TIMESTAMPING and one SO_RXQ_OVFL control message.
+ANC_BUFSIZE = socket.CMSG_SPACE(_SCM_TIMESTAMPING.size) + socket.CMSG_SPACE(_U32.size)
+
+
+def enable_rx_timestamps(sock: socket.socket, mode: str) -> str:
+    """Turn on receive timestamps for `mode`; returns the mode actually enabled.
+
+    "hw" asks for raw hardware stamps plus software stamps as a fallback and
+    degrades to "kernel" if SO_TIMESTAMPING is rejected. Whether the NIC
+    really stamps packets also depends on its hwtstamp config, which
+    ptp4l or `enable_nic_hw_timestamps` sets up.
+    """
+    if mode not in TIMESTAMP_MODES:
+        raise ValueError(f"unknown timestamp mode: {mode}")
+    if mode == "hw":
+        flags = (
+            SOF_TIMESTAMPING_RX_HARDWARE
+            | SOF_TIMESTAMPING_RAW_HARDWARE
+            | SOF_TIMESTAMPING_RX_SOFTWARE
+            | SOF_TIMESTAMPING_SOFTWARE
+        )
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, flags)
+            return "hw"
+        except OSError:
+            mode = "kernel"
+    if mode == "kernel":
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+            return "kernel"
+        except OSError:
+            pass
+    return "user"
+
+
+def enable_nic_hw_timestamps(sock: socket.socket, iface: str) -> bool:
+    """SIOCSHWTSTAMP: make `iface` stamp all received packets (needs CAP_NET_ADMIN).
+
+    Best effort; returns False if the driver or permissions refuse. Not
+    needed when ptp4l already runs on the interface with hardware stamping.
+    """
+    cfg = ctypes.create_string_buffer(struct.pack("@iii", 0, HWTSTAMP_TX_OFF, HWTSTAMP_FILTER_ALL), 12)
+    ifr = struct.pack("@16sP", iface.encode("ascii")[:15], ctypes.addressof(cfg)).ljust(40, b"\0")
+    try:
+        fcntl.ioctl(sock.fileno(), SIOCSHWTSTAMP, ifr)
+        return True
+    except OSError:
+        return False
+
+
+def _decode_ts(ctype: int, data, off: int = 0) -> tuple[int, str]:
+    """(ns, source) from a SO_TIMESTAMPNS / SCM_TIMESTAMPING payload; ns is 0 if unusable."""
+    if ctype == SO_TIMESTAMPNS:
+        sec, nsec = _TIMESPEC.unpack_from(data, off)
+        return sec * 1_000_000_000 + nsec, "kernel"
+    # ts[0] software, ts[1] legacy (unused), ts[2] raw hardware.
+    sw_s, sw_ns, _, _, hw_s, hw_ns = _SCM_TIMESTAMPING.unpack_from(data, off)
+    if hw_s or hw_ns:
+        return hw_s * 1_000_000_000 + hw_ns, "hw"
+    if sw_s or sw_ns:
+        return sw_s * 1_000_000_000 + sw_ns, "kernel"
+    return 0, "user"
+
+
+def parse_ancdata(ancdata) -> tuple[int, str, int]:
+    """Receive timestamp (ns, source) and SO_RXQ_OVFL count (-1 if absent) from recvmsg ancdata."""
+    ts_ns = 0
+    source = "user"
+    ovfl = -1
+    for level, ctype, data in ancdata:
+        if level != socket.SOL_SOCKET:
+            continue
+        if ctype in (SO_TIMESTAMPNS, SO_TIMESTAMPING):
+            ts_ns, source = _decode_ts(ctype, data)
+        elif ctype == SO_RXQ_OVFL and len(data) >= _U32.size:
+            ovfl = _U32.unpack_from(data)[0]
+    if not ts_ns:
+        return time.time_ns(), "user", ovfl
+    return ts_ns, source, ovfl
+
+
+def recv_into_timestamped(sock: socket.socket, buf) -> tuple[int, int, str]:
+    """recvmsg_into variant of `recv_into_checked` that also returns (ts_ns, source).
+
+    The socket must have timestamps enabled via `enable_rx_timestamps`,
+    ideally before bind() so queued datagrams are stamped on arrival too;
+    without ancillary data time.time_ns() is used and reported as "user".
+    """
+    n, ancdata, _flags, _addr = sock.recvmsg_into([buf], ANC_BUFSIZE, socket.MSG_TRUNC)
+    ts_ns, source, _ = parse_ancdata(ancdata)
+    return n, ts_ns, source
+
+
+def clock_source_label(counts: dict) -> str:
+    """Single source name if every packet used it, otherwise "mixed"."""
+    used = [k for k, v in counts.items() if v]
+    if not used:
+        return "none"
+    return used[0] if len(used) == 1 else "mixed"
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_recvmmsg():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fn = libc.recvmmsg
+    except (OSError, AttributeError):
+        return None
+    fn.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    fn.restype = ctypes.c_int
+    return fn
+
+
+_recvmmsg = _load_recvmmsg()
+
+
+def mmsg_available() -> bool:
+    return _recvmmsg is not None
+
+
+def _buffer_holder(buf):
+    # The ctypes view keeps the buffer export alive (and unresizable) for as
+    # long as the receiver points the kernel at it.
+    view = memoryview(buf)
+    if view.readonly or not view.c_contiguous:
+        raise ValueError("receive buffers must be writable and contiguous")
+    return (ctypes.c_char * view.nbytes).from_buffer(view)
+
+
+def _cmsg_space(data_len: int) -> int:
+    return (_CMSG_HDR.size + data_len + _CMSG_ALIGN - 1) // _CMSG_ALIGN * _CMSG_ALIGN
+
+
+class MmsgReceiver:
+    """Batched recvmmsg(2) receiver over caller-owned, preallocated buffers.
+
+    Each call to `recv` waits up to `timeout_s` for the socket to become
+    readable and then drains up to len(buffers) datagrams in one syscall.
+    Per-slot results are left in `lengths`, `truncated`, `timestamps_ns` and
+    `ts_sources`. With `ts_mode` "kernel" or "hw" the timestamps come from
+    ancillary data, i.e. when the kernel or NIC received the datagram rather
+    than when Python woke up; `ts_mode` holds the mode actually enabled.
+    `kernel_drops` is the socket's cumulative overflow count from
+    SO_RXQ_OVFL (-1 if it could not be enabled).
+    """
+
+    def __init__(self, sock: socket.socket, buffers: Sequence, ctrl_size: int = 256, ts_mode: str = "kernel") -> None:
+        if _recvmmsg is None:
+            raise OSError("recvmmsg is not available on this platform")
+        if not buffers:
+            raise ValueError("buffers must not be empty")
+        self.sock = sock
+        self.batch = len(buffers)
+        self._fd = sock.fileno()
+        self._poll = select.poll()
+        self._poll.register(self._fd, select.POLLIN)
+        self.ts_mode = enable_rx_timestamps(sock, ts_mode)
+        self.kernel_drops = 0 if enable_rxq_ovfl(sock) else -1
+
+        self._ctrl_size = ctrl_size
+        self._iov = (_IoVec * self.batch)()
+        self._msgs = (_MMsgHdr * self.batch)()
+        self._ctrl = (ctypes.c_char * (ctrl_size * self.batch))()
+        self._ctrl_view = memoryview(self._ctrl).cast("B")
+        self._holders = []
+        ctrl_base = ctypes.addressof(self._ctrl)
+        for i, buf in enumerate(buffers):
+            holder = _buffer_holder(buf)
+            self._holders.append(holder)
+            self._iov[i].iov_base = ctypes.addressof(holder)
+            self._iov[i].iov_len = ctypes.sizeof(holder)
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._iov[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_control = ctrl_base + i * ctrl_size
+            hdr.msg_controllen = ctrl_size
+
+        self.lengths = [0] * self.batch
+        self.truncated = [False] * self.batch
+        self.timestamps_ns = [0] * self.batch
+        self.ts_sources = ["user"] * self.batch
+        self.syscalls = 0
+        self._last_n = self.batch
+
+    def recv(self, timeout_s: float = 1.0) -> int:
+        if not self._poll.poll(int(timeout_s * 1000)):
+            return 0
+        # The kernel rewrites controllen/flags only for slots it filled.
+        for i in range(self._last_n):
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_controllen = self._ctrl_size
+            hdr.msg_flags = 0
+        n = _recvmmsg(self._fd, self._msgs, self.batch, MSG_DONTWAIT, None)
+        self.syscalls += 1
+        self._last_n = max(0, n)
+        if n < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return 0
+            raise OSError(err, os.strerror(err))
+        fallback_ns = time.time_ns()
+        for i in range(n):
+            m = self._msgs[i]
+            self.lengths[i] = m.msg_len
+            self.truncated[i] = bool(m.msg_hdr.msg_flags & MSG_TRUNC)
+            ts_ns, source = self._parse_cmsgs(i, m.msg_hdr.msg_controllen)
+            if not ts_ns:
+                ts_ns, source = fallback_ns, "user"
+            self.timestamps_ns[i] = ts_ns
+            self.ts_sources[i] = source
+        return n
+
+    def _parse_cmsgs(self, slot: int, ctrl_len: int) -> tuple[int, str]:
+        """Walk one slot's ancillary data; returns (timestamp ns, source), ns 0 if absent."""
+        base = slot * self._ctrl_size
+        off = 0
+        ts_ns = 0
+        source = "user"
+        while off + _CMSG_HDR.size <= ctrl_len:
+            cmsg_len, level, ctype = _CMSG_HDR.unpack_from(self._ctrl_view, base + off)
+            if cmsg_len < _CMSG_HDR.size:
+                break
+            data = base + off + _CMSG_HDR.size
+            if level == socket.SOL_SOCKET and ctype in (SO_TIMESTAMPNS, SO_TIMESTAMPING):
+                ts_ns, source = _decode_ts(ctype, self._ctrl_view, data)
+            elif level == socket.SOL_SOCKET and ctype == SO_RXQ_OVFL:
+                self.kernel_drops = max(self.kernel_drops, _U32.unpack_from(self._ctrl_view, data)[0])
+            off += _cmsg_space(cmsg_len - _CMSG_HDR.size)
+        return ts_ns, source
+
+
+def enable_rxq_ovfl(sock: socket.socket) -> bool:
+    """Ask the kernel to attach the socket drop counter to received datagrams."""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+        return True
+    except OSError:
+        return False
+
+
+def proc_udp_drops(inode: int) -> int | None:
+    """Drops column of /proc/net/udp{,6} for the socket with this inode."""
+    for path in ("/proc/net/udp", "/proc/net/udp6"):
+        try:
+            with open(path, encoding="ascii") as f:
+                next(f, None)
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 13 and int(parts[9]) == inode:
+                        return int(parts[12])
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+class KernelDropCounter:
+    """Cumulative kernel-side receive drops for one UDP socket.
+
+    Uses the SO_RXQ_OVFL value fed in by a receiver that reads ancillary data
+    (`note_cmsg`), and otherwise reads the socket's row in /proc/net/udp.
+    Drops counted here happened on this host, before the datagram reached
+    userspace, so they say nothing about the TAS gate.
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        self._inode = os.fstat(sock.fileno()).st_ino
+        self._cmsg_value = None
+        self.source = "proc" if proc_udp_drops(self._inode) is not None else "none"
+
+    def note_cmsg(self, value: int) -> None:
+        if value >= 0:
+            self._cmsg_value = value
+            self.source = "so_rxq_ovfl"
+
+    def total(self) -> int:
+        if self._cmsg_value is not None:
+            return self._cmsg_value
+        v = proc_udp_drops(self._inode)
+        return v if v is not None else 0
+
+
+_PKT_HEAD = struct.Struct("<HH")
+
+
+def capture_udp(
+    port: int,
+    duration_s: float,
+    rcvbuf: int,
+    backend: str = "mmsg",
+    batch: int = 64,
+    ts_mode: str = "kernel",
+) -> tuple[list[dict], dict]:
+    """Capture every datagram on `port` for `duration_s`; returns (rows, rx_info).
+
+    Rows hold t_s (seconds since the first packet), len, and packet_type /
+    frame_id from the first two u16 of the packet. backend "mmsg" drains
+    batches through MmsgReceiver, "recvfrom" reads one datagram per call and
+    is used when recvmmsg is unavailable. rx_info has the backend and
+    timestamp mode actually used, the clock source label and host-side
+    kernel drops, in total and per 1 s window to locate contaminated stretches.
+    The first packet fixes the clock; packets stamped by another clock are
+    left out of rows and counted in rx_info["ts_mismatch"].
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    # Before bind, so datagrams queued before the first read carry arrival stamps.
+    ts_mode = enable_rx_timestamps(sock, ts_mode)
+    sock.bind(("0.0.0.0", port))
+    sock.settimeout(1.0)
+    drops = KernelDropCounter(sock)
+    if backend == "mmsg" and not mmsg_available():
+        backend = "recvfrom"
+    rows = []
+    ts_counts = Counter()
+    drop_windows = []
+    t0_ns = None
+    run_source = None
+    mismatch = 0
+
+    def add(ts_ns: int, source: str, data, length: int) -> None:
+        nonlocal t0_ns, run_source, mismatch
+        ts_counts[source] += 1
+        if run_source is None:
+            run_source, t0_ns = source, ts_ns
+        elif source != run_source:
+            mismatch += 1
+            return
+        packet_type = frame_id = None
+        if length >= _PKT_HEAD.size:
+            packet_type, frame_id = _PKT_HEAD.unpack_from(data, 0)
+        rows.append({"t_s": (ts_ns - t0_ns) * 1e-9, "len": length, "packet_type": packet_type, "frame_id": frame_id})
+
+    if backend == "mmsg":
+        bufs = [bytearray(65535) for _ in range(batch)]
+        rx = MmsgReceiver(sock, bufs, ts_mode=ts_mode)
+        ts_mode = rx.ts_mode
+
+    start = time.perf_counter()
+    next_window = start + 1.0
+    drops_last = 0
+    try:
+        while (now := time.perf_counter()) - start < duration_s:
+            if now >= next_window:
+                total = drops.total()
+                drop_windows.append(total - drops_last)
+                drops_last = total
+                next_window += 1.0
+            if backend == "mmsg":
+                n = rx.recv(1.0)
+                drops.note_cmsg(rx.kernel_drops)
+                for i in range(n):
+                    add(rx.timestamps_ns[i], rx.ts_sources[i], bufs[i], rx.lengths[i])
+                continue
+            try:
+                if ts_mode == "user":
+                    data, _ = sock.recvfrom(65535)
+                    ts_ns, source = time.time_ns(), "user"
+                else:
+                    data, ancdata, _flags, _addr = sock.recvmsg(65535, ANC_BUFSIZE)
+                    ts_ns, source, _ = parse_ancdata(ancdata)
+            except socket.timeout:
+                continue
+            add(ts_ns, source, data, len(data))
+        rx_info = {
+            "backend": backend,
+            "kernel_drops": drops.total(),
+            "kernel_drops_source": drops.source,
+            "kernel_drops_per_s": drop_windows,
+            "ts_mode": ts_mode,
+            "clock_source": clock_source_label(ts_counts),
+            "ts_mismatch": mismatch,
+        }
+    finally:
+        sock.close()
+    return rows, rx_info
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Latest-frame hand-off between processes over POSIX shared memory.
+
+The processing thread writes each frame (xyz, motion xyz, RANGE image and a
+JSON meta blob) into one of two slots and flips `current`; readers in other
+processes copy the current slot out. Every slot carries a sequence counter
+(seqlock): odd while the writer is inside, bumped again when done, so a
+reader that saw the counter change during its copy retries instead of
+returning a torn frame. The writer never waits for readers.
+
+    ctrl    64 B   u64: magic, max_px, meta_cap, current, lut_seq,
+                   lut_version, lut_h, lut_w
+    demand  64 B   f64: last time a reader's clients asked for xyz
+    slot x2        u64[8] seq, fid, lut_version, n_pts, n_mpts, h, w,
+                   meta_len; f32 xyz[max_px], f32 motion xyz[max_px],
+                   u32 range[max_px], meta[meta_cap]
+    lut            f32 direction[max_px], f32 offset[max_px] (seqlock lut_seq)
+"""
+
+from __future__ import annotations
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+MAGIC = 0x4C545348  # "LTSH"
+# OS-1 128 beams x 2048 columns, the largest supported mode.
+MAX_PIXELS = 128 * 2048
+META_CAPACITY = 1 << 20
+READ_RETRIES = 4
+
+
+def _align(n: int) -> int:
+    return (n + 63) & ~63
+
+
+class FrameShm:
+    """One writer (`write`, `write_lut`), any number of readers (`read`, `read_lut`)."""
+
+    def __init__(
+        self, name: str | None = None, create: bool = False, max_px: int = MAX_PIXELS, meta_cap: int = META_CAPACITY
+    ) -> None:
+        if create:
+            size = 128 + 2 * self._slot_size(max_px, meta_cap) + max_px * 24
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.ctrl = np.ndarray(8, dtype=np.uint64, buffer=self.shm.buf)
+            self.ctrl[:] = (MAGIC, max_px, meta_cap, 0, 0, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.ctrl = np.ndarray(8, dtype=np.uint64, buffer=self.shm.buf)
+            if int(self.ctrl[0]) != MAGIC:
+                raise ValueError(f"{name} is not a frame shared-memory block")
+            max_px, meta_cap = int(self.ctrl[1]), int(self.ctrl[2])
+        self.name = self.shm.name
+        self.max_px = max_px
+        self.meta_cap = meta_cap
+        self._demand = np.ndarray(1, dtype=np.float64, buffer=self.shm.buf, offset=64)
+        slot_size = self._slot_size(max_px, meta_cap)
+        self.slots = [self._slot_views(128 + i * slot_size) for i in range(2)]
+        lut_off = 128 + 2 * slot_size
+        self._lut_dir = np.ndarray((max_px, 3), dtype=np.float32, buffer=self.shm.buf, offset=lut_off)
+        self._lut_off = np.ndarray((max_px, 3), dtype=np.float32, buffer=self.shm.buf, offset=lut_off + max_px * 12)
+
+    @staticmethod
+    def _slot_size(max_px: int, meta_cap: int) -> int:
+        return _align(64 + max_px * 28 + meta_cap)
+
+    def _slot_views(self, off: int) -> dict:
+        buf, n = self.shm.buf, self.max_px
+        return {
+            "hdr": np.ndarray(8, dtype=np.uint64, buffer=buf, offset=off),
+            "pts": np.ndarray((n, 3), dtype=np.float32, buffer=buf, offset=off + 64),
+            "mpts": np.ndarray((n, 3), dtype=np.float32, buffer=buf, offset=off + 64 + n * 12),
+            "range": np.ndarray(n, dtype=np.uint32, buffer=buf, offset=off + 64 + n * 24),
+            "meta": np.ndarray(self.meta_cap, dtype=np.uint8, buffer=buf, offset=off + 64 + n * 28),
+        }
+
+    def write(
+        self, fid: int, pts: np.ndarray, mpts: np.ndarray, range_img: np.ndarray | None, lut_version: int, meta: bytes
+    ) -> None:
+        """Publish one frame; clouds beyond max_px are truncated, oversize meta raises ValueError."""
+        if len(meta) > self.meta_cap:
+            raise ValueError(f"frame meta of {len(meta)} B exceeds {self.meta_cap} B")
+        pts, mpts = pts[: self.max_px], mpts[: self.max_px]
+        h, w = range_img.shape if range_img is not None and range_img.size <= self.max_px else (0, 0)
+        cur = (int(self.ctrl[3]) + 1) & 1
+        s = self.slots[cur]
+        hdr = s["hdr"]
+        hdr[0] += 1  # odd: slot is being written
+        s["pts"][: len(pts)] = pts
+        s["mpts"][: len(mpts)] = mpts
+        if h:
+            s["range"][: h * w] = range_img.reshape(-1)
+        s["meta"][: len(meta)] = np.frombuffer(meta, dtype=np.uint8)
+        hdr[1:] = (fid, lut_version, len(pts), len(mpts), h, w, len(meta))
+        hdr[0] += 1
+        self.ctrl[3] = cur
+
+    def read(self, after_fid: int = -1) -> dict | None:
+        """Copy of the newest frame if its fid differs from `after_fid`, else None."""
+        for _ in range(READ_RETRIES):
+            s = self.slots[int(self.ctrl[3]) & 1]
+            hdr = s["hdr"]
+            seq = int(hdr[0])
+            if seq == 0:
+                return None  # nothing published yet
+            if seq & 1:
+                continue
+            fid, lut_version, n, nm, h, w, meta_len = (int(v) for v in hdr[1:])
+            if fid == after_fid:
+                return None
+            frame = {
+                "fid": fid,
+                "lut_version": lut_version,
+                "pts": s["pts"][:n].copy(),
+                "mpts": s["mpts"][:nm].copy(),
+                "range": s["range"][: h * w].reshape(h, w).copy() if h else None,
+                "meta": s["meta"][:meta_len].tobytes(),
+            }
+            if int(hdr[0]) == seq:
+                return frame
+        return None
+
+    def write_lut(self, version: int, h: int, w: int, lut: tuple[np.ndarray, np.ndarray]) -> None:
+        n = h * w
+        if n > self.max_px:
+            return
+        self.ctrl[4] += 1
+        self._lut_dir[:n] = lut[0]
+        self._lut_off[:n] = lut[1]
+        self.ctrl[5:8] = (version, h, w)
+        self.ctrl[4] += 1
+
+    def read_lut(self, known_version: int) -> tuple[int, int, int, tuple[np.ndarray, np.ndarray]] | None:
+        """(version, h, w, (direction, offset)) if a LUT other than `known_version` is published."""
+        for _ in range(READ_RETRIES):
+            seq = int(self.ctrl[4])
+            if seq & 1:
+                continue
+            version, h, w = (int(v) for v in self.ctrl[5:8])
+            if version == known_version or not h:
+                return None
+            lut = (self._lut_dir[: h * w].copy(), self._lut_off[: h * w].copy())
+            if int(self.ctrl[4]) == seq:
+                return version, h, w, lut
+        return None
+
+    @property
+    def demand_t(self) -> float:
+        return float(self._demand[0])
+
+    def touch_demand(self, t: float) -> None:
+        self._demand[0] = t
+
+    def close(self) -> None:
+        # Drop the numpy views first; SharedMemory.close() refuses while buffers are exported.
+        self.ctrl = self._demand = self._lut_dir = self._lut_off = None
+        self.slots = []
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Client for the server's /api/stats/stream (Server-Sent Events).
+
+Every processed frame arrives as one unsmoothed record with `seq` (frame
+id), `boot_id`, host times (`t_host`, `t_frame_done`, `rx_first_s`,
+`rx_last_s`) and sensor column timestamps (`sensor_ts_first_ns`,
+`sensor_ts_last_ns`). On a dropped connection the client reconnects with
+Last-Event-ID, so the server replays what was missed from its history and
+each frame is seen exactly once unless it fell out of that history.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+
+import requests
+
+
+def iter_stats(
+    url: str, after: int | None = None, timeout: float = 5.0, reconnects: int = 5, until: float | None = None
+):
+    """Yield per-frame stats records from `url` (.../api/stats/stream) until time.monotonic() >= `until`."""
+    last = after
+    boot_id = None
+    failures = 0
+    while until is None or time.monotonic() < until:
+        headers = {"Accept": "text/event-stream"}
+        if last is not None:
+            headers["Last-Event-ID"] = str(last)
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=timeout) as r:
+                r.raise_for_status()
+                data = []
+                for line in r.iter_lines(decode_unicode=True):
+                    if until is not None and time.monotonic() >= until:
+                        return
+                    if line.startswith("data:"):
+                        data.append(line[5:].strip())
+                    elif line == "" and data:
+                        rec = json.loads("\n".join(data))
+                        data = []
+                        if boot_id is not None and rec.get("boot_id") != boot_id:
+                            last = None  # server restarted: seq starts over
+                        boot_id = rec.get("boot_id")
+                        if last is not None and rec["seq"] <= last:
+                            continue
+                        last = rec["seq"]
+                        failures = 0
+                        yield rec
+        except (requests.RequestException, ValueError):
+            failures += 1
+            if failures > reconnects:
+                raise
+            time.sleep(0.2 * failures)
+
+
+def collect_stats(url: str, duration_s: float, timeout: float = 5.0) -> tuple[list[dict], int]:
+    """(records, frames_missed) for every frame processed during the next `duration_s` seconds."""
+    records = list(iter_stats(url, timeout=timeout, until=time.monotonic() + duration_s))
+    missed = sum(b["seq"] - a["seq"] - 1 for a, b in zip(records, records[1:]) if b["seq"] > a["seq"])
+    return records, missed
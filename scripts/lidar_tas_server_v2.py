@@ -4,20 +4,53 @@
 from __future__ import annotations
 
 import argparse
+import json
+import multiprocessing
 import os
 import socket
-import statistics
+import struct
 import subprocess
 import threading
 import time
+import zlib
 from collections import Counter, deque
+from urllib.parse import urlsplit
 
 import numpy as np
 import ouster.sdk.core as core
 import requests
-from flask import Flask, jsonify, render_template_string, request as flask_request
+from flask import Flask, Response, jsonify, redirect, render_template_string, request as flask_request
 from flask_cors import CORS
 
+from lidar_motion import (
+    BackgroundStore,
+    DecayingBackground,
+    DecimationController,
+    RangeImageMotion,
+    background_from_history,
+    motion_clusters,
+    rescale_voxel_keys,
+    roi_boxes,
+    roi_mask,
+    voxel_keys,
+)
+import lidar_pointcodec
+from lidar_lod import VoxelLod
+from lidar_shm import FrameShm
+from lidar_tracker import MAX_OBJECTS, MultiObjectTracker
+from lidar_rx import (
+    TIMESTAMP_MODES,
+    KernelDropCounter,
+    MmsgReceiver,
+    PacketPool,
+    clock_source_label,
+    enable_nic_hw_timestamps,
+    enable_rx_timestamps,
+    mmsg_available,
+    recv_into_checked,
+    recv_into_timestamped,
+)
+
 DEFAULT_LIDAR_HOST = "192.168.6.11"
 DEFAULT_LIDAR_PORT = 7502
 DEFAULT_KETI_TSN_DIR = "/home/kim/keti-tsn-cli-new"
@@ -31,6 +64,10 @@ SUPPORTED_LIDAR_MODES = [
     "2048x10",
 ]
 
+# Valid range window applied to the RANGE field before XYZ projection.
+RANGE_MIN_MM = 300
+RANGE_MAX_MM = 100_000
+
 app = Flask(__name__)
 CORS(app)
 
@@ -39,10 +76,53 @@ running = True
 lidar_connected = False
 force_reconnect = False
 
-latest_points = None
-latest_motion_points = None
+# Latest frame as (N, 3) float32 arrays; handlers slice them, never mutate.
+latest_points = np.empty((0, 3), dtype=np.float32)
+latest_motion_points = np.empty((0, 3), dtype=np.float32)
 latest_tracks = []
 latest_frame_id = 0
+# Frames completed by ingest, across reconnects; a frame's id is its value
+# here, so frames the processing queue drops leave gaps in frame_id.
+ingest_frame_seq = 0
+# XYZ LUT of the current sensor geometry for /api/lut.bin; `version` bumps
+# whenever the LUT object changes (reconnect, mode switch).
+lut_state = {"version": 0, "lut": None, "h": 0, "w": 0}
+# Last time a client asked for XYZ (points endpoints or an XYZ stream); with
+# the range-image motion backend and only range-stream clients the server
+# skips XYZ projection entirely.
+xyz_demand = {"t": 0.0}
+XYZ_DEMAND_S = 2.0
+# /api/stats/stream: one unsmoothed record per processed frame, `seq` =
+# frame_id, numbered by ingest so frames dropped before processing show up
+# as gaps. Encoded SSE events are kept for Last-Event-ID resume.
+STATS_STREAM_DEPTH = 256
+STATS_HISTORY = 1200
+stats_history = deque(maxlen=STATS_HISTORY)
+# --data-port (opt-in): the point/stats endpoints run in a separate process that reads
+# frames from shared memory, so HTTP load has its own GIL instead of taking
+# turns with ingest. `data_plane` is the lidar_shm.FrameShm (writer here,
+# reader there); in the data-plane process `data_plane_stats` holds the
+# stats the main process attached to the latest shared frame.
+data_plane = None
+data_plane_stats = None
+# Host time the main process wrote data_plane_stats; older than
+# DATA_PLANE_STALE_S means no frames are arriving (sensor gone, gate closed).
+data_plane_stats_t = 0.0
+DATA_PLANE_STALE_S = 2.0
+data_plane_cfg = {"port": 0}
+DATA_PLANE_PATHS = {
+    "/api/points",
+    "/api/points.bin",
+    "/api/stream.bin",
+    "/api/range.bin",
+    "/api/lut.bin",
+    "/api/stats",
+}
+# Paths the main port hands to the data plane. /api/stats stays in the main
+# process, the only one that sees ingest while no frames are published.
+DATA_PLANE_REDIRECT_PATHS = DATA_PLANE_PATHS - {"/api/stats"}
+# Unsmoothed gap stats per window ("frame", "1s", "10s"), see GAP_WINDOWS.
+gap_windows = {}
 
 tas_state = {
     "enabled": False,
@@ -65,14 +145,42 @@ current_stats = {
     "gap_mean_us": 0.0,
     "gap_stdev_us": 0.0,
     "gap_max_us": 0.0,
+    "gap_p50_us": 0.0,
+    "gap_p95_us": 0.0,
+    "gap_p99_us": 0.0,
     "burst_pct": 0.0,
     "motion_points": 0,
     "motion_ratio": 0.0,
     "moving_objects": 0,
+    "ingest_pkt_buffers": 0,
+    "pool_misses_per_pkt": 0.0,
+    "ingest_pkts_per_syscall": 0.0,
+    "proc_queue_depth": 0,
+    "proc_frames_dropped": 0,
+    "proc_latency_ms": 0.0,
+    "tracks_alive": 0,
+    "track_latency_ms": 0.0,
+    "motion_ms": 0.0,
+    "motion_level": 0,
+    "scan_allocs": 0,
+    "kernel_drops_total": 0,
+    "kernel_drops_window": 0,
+    "ts_mismatch_total": 0,
 }
 
 smoothed_stats = dict(current_stats)
 EMA_ALPHA = 0.15
+# Cumulative counters are reported as-is instead of EMA-smoothed.
+# Kernel drop counts stay exact so sweeps can reject samples with host-side loss.
+COUNTER_STATS = {
+    "motion_level",
+    "ingest_pkt_buffers",
+    "proc_frames_dropped",
+    "scan_allocs",
+    "kernel_drops_total",
+    "kernel_drops_window",
+    "ts_mismatch_total",
+}
 
 lidar_state = {
     "host": DEFAULT_LIDAR_HOST,
@@ -89,10 +197,72 @@ motion_cfg = {
     "voxel_m": 0.25,
     "bg_required_frames": 20,
     "bg_ready": False,
+    # "decay": online per-voxel model (DecayingBackground), absorbs static
+    # changes over bg_horizon_frames; "frozen": learn once from
+    # bg_required_frames frames and keep it until reset.
+    "bg_model": "decay",
+    "bg_horizon_frames": 300,
+    "bg_occupancy": 0.7,
+    "bg_max_voxels": 200_000,
+    # "voxel": background subtraction on XYZ voxels (bg_model applies),
+    # "range_image": per-pixel range background on the destaggered scan.
+    "backend": "voxel",
+    # Clusters handed to the tracker per frame.
+    "max_objects": MAX_OBJECTS,
+    # Boxes [{"min": [x,y,z], "max": [x,y,z]}] in sensor frame; motion only
+    # looks at points inside any of them. Empty = whole scan.
+    "roi": [],
+    # Voxel backend: step through DECIMATION_LEVELS to keep motion + tracking
+    # under budget_ms per frame.
+    "adaptive": True,
+    "budget_ms": 50.0,
+    # Seconds between background snapshots (see BackgroundStore).
+    "bg_snapshot_s": 30.0,
+}
+
+BG_MODELS = ["decay", "frozen"]
+MOTION_BACKENDS = ["voxel", "range_image"]
+
+# "mmsg": recvmmsg batches into preallocated LidarPackets (falls back to "pool"),
+# "pool": recv_into preallocated LidarPackets, "copy": legacy recvfrom + copy.
+INGEST_MODES = ["mmsg", "pool", "copy"]
+
+ingest_cfg = {
+    "mode": "pool",
+    "mmsg_batch": 32,
+    "ts_mode": "kernel",
+    "ts_iface": "",
+    # Skip ScanBatcher/XYZ/motion; frame stats come from packet headers only.
+    "stats_only": False,
+}
+
+ingest_state = {
+    "kernel_drops_source": "none",
+    # Receive timestamp mode actually enabled on the socket, and the clock
+    # that stamped every packet of the last frame (hw/kernel/user/mixed).
+    "ts_mode_active": "none",
+    "clock_source": "none",
 }
 
+# Per-frame unique voxel keys during warm-up, then the sorted background keys.
 _bg_history = deque(maxlen=20)
-_bg_voxel_set = set()
+_bg_keys = np.empty(0, dtype=np.int64)
+# Voxel size of _bg_keys and _bg_history; detect_motion rescales both when
+# the decimation level changes it, so the frozen model never starts over.
+_bg_keys_m = 0.0
+# Built by reset_motion_background, so the spawned data-plane process, which
+# re-imports this module, never allocates a voxel table it does not use.
+_bg_model = None
+# Built lazily per sensor geometry by detect_motion_range_image.
+_ri_model = None
+_ri_restore = None
+_tracker = MultiObjectTracker()
+_roi = roi_boxes([])
+_decimation = DecimationController(motion_cfg["budget_ms"])
+
+# Background persistence: one snapshot per sensor serial, lidar_mode and model.
+bg_store = None
+motion_state = {"snapshot_name": None, "sensor_key": None, "snapshot_t": 0.0, "restored": False, "restore_pending": False}
 
 
 def api_post(host: str, path: str, timeout: float = 3.0) -> dict:
@@ -226,95 +396,541 @@ def apply_tas(keti_tsn_dir: str, cycle_us: int, open_us: int) -> bool:
     return apply_tas_entries(keti_tsn_dir, int(cycle_us), entries)
 
 
-def voxelize(points: np.ndarray, voxel_m: float) -> np.ndarray:
-    if points.size == 0:
-        return np.empty((0, 3), dtype=np.int32)
-    return np.floor(points / voxel_m).astype(np.int32)
+def effective_voxel_m() -> float:
+    return motion_cfg["voxel_m"] * _decimation.voxel_scale
 
 
 def detect_motion(points: np.ndarray) -> tuple[np.ndarray, list[dict]]:
-    global _bg_voxel_set
+    """Voxel backend on ROI-filtered, decimated points."""
+    global _bg_keys, _bg_keys_m
 
+    if _roi.shape[0]:
+        points = points[roi_mask(points, _roi)]
+    if _decimation.stride > 1:
+        points = points[:: _decimation.stride]
     if points.size == 0:
         return np.empty((0, 3), dtype=np.float32), []
 
-    vox = voxelize(points, motion_cfg["voxel_m"])
-    current_vox_set = set(map(tuple, vox.tolist()))
+    voxel_m = effective_voxel_m()
+    keys = voxel_keys(points, voxel_m)
+
+    if motion_cfg["bg_model"] == "decay":
+        ukeys = np.unique(keys)
+        bg_keys = ukeys[_bg_model.update(ukeys)]
+        motion_cfg["bg_ready"] = True
+        return motion_clusters(points, keys, bg_keys, motion_cfg["max_objects"])
+
+    if _bg_keys_m != voxel_m:
+        if _bg_keys_m:
+            _bg_keys = rescale_voxel_keys(_bg_keys, _bg_keys_m, voxel_m)
+            for i, h in enumerate(_bg_history):
+                _bg_history[i] = rescale_voxel_keys(h, _bg_keys_m, voxel_m)
+        _bg_keys_m = voxel_m
 
     if not motion_cfg["bg_ready"]:
-        _bg_history.append(current_vox_set)
+        _bg_history.append(np.unique(keys))
         if len(_bg_history) >= motion_cfg["bg_required_frames"]:
-            count = Counter()
-            for s in _bg_history:
-                count.update(s)
             min_hits = max(2, int(len(_bg_history) * 0.7))
-            _bg_voxel_set = {k for k, v in count.items() if v >= min_hits}
+            _bg_keys = background_from_history(_bg_history, min_hits)
             motion_cfg["bg_ready"] = True
         return np.empty((0, 3), dtype=np.float32), []
 
-    moving_vox = current_vox_set - _bg_voxel_set
-    if not moving_vox:
-        return np.empty((0, 3), dtype=np.float32), []
-
-    # Map voxel -> points in that voxel.
-    voxel_points = {}
-    for i, vk in enumerate(map(tuple, vox.tolist())):
-        if vk in moving_vox:
-            voxel_points.setdefault(vk, []).append(points[i])
-
-    # 6-neighbor clustering in voxel space.
-    unvisited = set(moving_vox)
-    clusters = []
-    neighbors = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]
-
-    while unvisited:
-        seed = unvisited.pop()
-        q = [seed]
-        cluster_vox = {seed}
-        while q:
-            cx, cy, cz = q.pop()
-            for dx, dy, dz in neighbors:
-                nb = (cx + dx, cy + dy, cz + dz)
-                if nb in unvisited:
-                    unvisited.remove(nb)
-                    q.append(nb)
-                    cluster_vox.add(nb)
-        clusters.append(cluster_vox)
-
-    tracks = []
-    moving_pts = []
-    for cid, cvox in enumerate(sorted(clusters, key=len, reverse=True)[:5], start=1):
-        pts = []
-        for vk in cvox:
-            pts.extend(voxel_points.get(vk, []))
-        if len(pts) < 12:
-            continue
-        arr = np.asarray(pts, dtype=np.float32)
-        center = arr.mean(axis=0)
-        tracks.append(
-            {
-                "id": cid,
-                "points": int(arr.shape[0]),
-                "centroid": [float(center[0]), float(center[1]), float(center[2])],
-            }
-        )
-        moving_pts.append(arr)
+    return motion_clusters(points, keys, _bg_keys, motion_cfg["max_objects"])
 
-    if moving_pts:
-        return np.concatenate(moving_pts, axis=0), tracks
-    return np.empty((0, 3), dtype=np.float32), []
 
+def detect_motion_range_image(scan, frame: dict) -> tuple[np.ndarray, list[dict]]:
+    global _ri_model
 
-def reset_motion_background() -> None:
-    global _bg_voxel_set
+    model = _ri_model
+    if model is None or model.lut is not frame["xyz_lut"]:
+        h, w = frame["h"], frame["w"]
+        model = RangeImageMotion(
+            h,
+            w,
+            frame["pixel_shift"],
+            frame["xyz_lut"],
+            RANGE_MIN_MM,
+            RANGE_MAX_MM,
+            horizon_frames=motion_cfg["bg_horizon_frames"],
+        )
+        if _ri_restore is not None and _ri_restore.size == h * w:
+            model.bg = _ri_restore.astype(np.float32)
+        _ri_model = model
+    motion_cfg["bg_ready"] = True
+    return model.update(scan.field(core.ChanField.RANGE), motion_cfg["max_objects"], roi=_roi)
+
+
+def reset_motion_background(keep_tracks: bool = False) -> None:
+    global _bg_keys, _bg_keys_m, _bg_model, _ri_model, _ri_restore
+    _ri_model = None
+    _ri_restore = None
+    if not keep_tracks:
+        _tracker.reset()
     _bg_history.clear()
-    _bg_voxel_set = set()
+    _bg_keys = np.empty(0, dtype=np.int64)
+    _bg_keys_m = 0.0
+    _bg_model = DecayingBackground(
+        motion_cfg["bg_max_voxels"], motion_cfg["bg_horizon_frames"], motion_cfg["bg_occupancy"]
+    )
     motion_cfg["bg_ready"] = False
 
 
+def motion_snapshot_name(sensor_key: str) -> str:
+    if motion_cfg["backend"] == "range_image":
+        return f"{sensor_key}_range_image"
+    if motion_cfg["bg_model"] == "frozen":
+        # Frozen keys follow decimation levels (detect_motion), so only the base size names them.
+        return f"{sensor_key}_voxel-frozen_{motion_cfg['voxel_m']:g}m"
+    return f"{sensor_key}_voxel-{motion_cfg['bg_model']}_{effective_voxel_m():g}m"
+
+
+def save_motion_snapshot(name: str) -> None:
+    """Queue a copy of the active background model; the write happens on bg_store's thread."""
+    if bg_store is None:
+        return
+    meta = {"saved": time.time(), "backend": motion_cfg["backend"], "bg_model": motion_cfg["bg_model"]}
+    if motion_cfg["backend"] == "range_image":
+        model = _ri_model
+        if model is None or model.bg is None:
+            return
+        bg_store.submit(name, model.bg.copy(), {**meta, "h": model.h, "w": model.w})
+    elif motion_cfg["bg_model"] == "decay":
+        bg_store.submit(name, _bg_model.export_state(), {**meta, "frame": _bg_model.frame})
+    elif motion_cfg["bg_ready"]:
+        bg_store.submit(name, _bg_keys.copy(), {**meta, "voxel_m": _bg_keys_m})
+
+
+def restore_motion_snapshot(name: str) -> bool:
+    """Warm-start from an in-memory snapshot (see BackgroundStore.prefetch); a miss starts cold."""
+    global _bg_keys, _bg_keys_m, _ri_restore
+    if bg_store is None:
+        return False
+    snap = bg_store.load(name)
+    if snap is None:
+        return False
+    arr, meta = snap
+    if motion_cfg["backend"] == "range_image":
+        _ri_restore = arr
+        if _ri_model is not None and arr.size == _ri_model.h * _ri_model.w:
+            _ri_model.bg = arr.astype(np.float32)
+    elif motion_cfg["bg_model"] == "decay":
+        _bg_model.load_state(arr, meta.get("frame", 1))
+        motion_cfg["bg_ready"] = True
+    else:
+        _bg_keys = arr
+        _bg_keys_m = meta.get("voxel_m", motion_cfg["voxel_m"])
+        motion_cfg["bg_ready"] = True
+    return True
+
+
+def sync_motion_snapshot(frame: dict) -> None:
+    """Swap backgrounds when sensor/mode/model/voxel size changes and snapshot periodically.
+
+    A reconnect to the same sensor and mode keeps the in-memory model; a
+    new key first saves the old model and then restores the new key's
+    snapshot, so tracking is live on the first frame. If the prefetch of
+    that snapshot is still loading, later frames retry until it lands (no
+    periodic save meanwhile, which would shadow it). Tracks survive a swap
+    on the same sensor (e.g. a decimation level change).
+    """
+    name = motion_snapshot_name(frame["sensor_key"])
+    now = time.time()
+    if name != motion_state["snapshot_name"]:
+        if motion_state["snapshot_name"] is not None:
+            save_motion_snapshot(motion_state["snapshot_name"])
+        reset_motion_background(keep_tracks=motion_state.get("sensor_key") == frame["sensor_key"])
+        motion_state["sensor_key"] = frame["sensor_key"]
+        motion_state["restored"] = restore_motion_snapshot(name)
+        motion_state["restore_pending"] = not motion_state["restored"] and bg_store is not None and bg_store.prefetching()
+        motion_state["snapshot_name"] = name
+        motion_state["snapshot_t"] = now
+    elif motion_state["restore_pending"]:
+        motion_state["restored"] = restore_motion_snapshot(name)
+        motion_state["restore_pending"] = not motion_state["restored"] and bg_store.prefetching()
+    elif now - motion_state["snapshot_t"] >= motion_cfg["bg_snapshot_s"]:
+        save_motion_snapshot(name)
+        motion_state["snapshot_t"] = now
+
+
+def iter_lidar_packets(sock: socket.socket, pkt_size: int, counters: dict, drops: KernelDropCounter):
+    """Yield (LidarPacket, rx_time_s) for every well-sized datagram.
+
+    The packet is only valid until the next iteration; pooled buffers are
+    reused. `counters` tracks packet buffers created ("buffers", including the
+    initial fill), packets that found no free pooled buffer ("misses"),
+    receive syscalls and how many packets were stamped by each clock source;
+    receivers that see SO_RXQ_OVFL ancillary data feed it to `drops`.
+    rx_time_s is only meaningful as a difference: hardware stamps come from
+    the NIC clock. The first packet fixes the clock for the connection; a
+    packet stamped by another clock (hw mode without a NIC stamp, missing
+    ancillary data) is yielded with rx_time_s None and counted in
+    "ts_mismatch", so gaps never span two clocks.
+    """
+    mode = ingest_cfg["mode"]
+    if mode == "mmsg" and not mmsg_available():
+        print("recvmmsg unavailable, falling back to pool ingest")
+        mode = "pool"
+    ts_counts = counters["ts_sources"]
+    # Rebase on the first stamp so float seconds keep ns resolution.
+    epoch_ns = None
+    run_source = None
+
+    if mode == "mmsg":
+        pkts = [core.LidarPacket(pkt_size) for _ in range(ingest_cfg["mmsg_batch"])]
+        rx = MmsgReceiver(sock, [p.buf for p in pkts], ts_mode=ingest_cfg["ts_mode"])
+        ingest_state["ts_mode_active"] = rx.ts_mode
+        counters["buffers"] += len(pkts)
+        while running and not force_reconnect:
+            n = rx.recv(1.0)
+            if n == 0:
+                continue
+            counters["syscalls"] += 1
+            drops.note_cmsg(rx.kernel_drops)
+            for i in range(n):
+                if rx.truncated[i] or rx.lengths[i] != pkt_size:
+                    continue
+                source = rx.ts_sources[i]
+                ts_counts[source] += 1
+                if run_source is None:
+                    run_source, epoch_ns = source, rx.timestamps_ns[i]
+                elif source != run_source:
+                    counters["ts_mismatch"] += 1
+                    yield pkts[i], None
+                    continue
+                yield pkts[i], (rx.timestamps_ns[i] - epoch_ns) * 1e-9
+
+    elif mode == "pool":
+        ts_mode = enable_rx_timestamps(sock, ingest_cfg["ts_mode"])
+        ingest_state["ts_mode_active"] = ts_mode
+        # The consumer copies each packet into its scan before asking for the
+        # next one, so a single buffer is all the pool ever hands out.
+        pool = PacketPool(lambda: core.LidarPacket(pkt_size), 1)
+        buffers_base = counters["buffers"]
+        misses_base = counters["misses"]
+        counters["buffers"] = buffers_base + pool.allocs
+        while running and not force_reconnect:
+            pkt_obj = pool.acquire()
+            try:
+                if ts_mode == "user":
+                    n = recv_into_checked(sock, pkt_obj.buf)
+                    ts_ns, source = time.time_ns(), "user"
+                else:
+                    n, ts_ns, source = recv_into_timestamped(sock, pkt_obj.buf)
+            except socket.timeout:
+                n = 0
+            if n:
+                counters["syscalls"] += 1
+            if n == pkt_size:
+                ts_counts[source] += 1
+                if run_source is None:
+                    run_source, epoch_ns = source, ts_ns
+                if source == run_source:
+                    yield pkt_obj, (ts_ns - epoch_ns) * 1e-9
+                else:
+                    counters["ts_mismatch"] += 1
+                    yield pkt_obj, None
+            pool.release(pkt_obj)
+            counters["buffers"] = buffers_base + pool.allocs
+            counters["misses"] = misses_base + pool.allocs - pool.depth
+
+    else:
+        # Legacy path kept as the baseline: recvfrom + user-space clock.
+        ingest_state["ts_mode_active"] = "user"
+        while running and not force_reconnect:
+            try:
+                data, _ = sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            counters["syscalls"] += 1
+
+            if len(data) != pkt_size:
+                continue
+
+            # Same user clock as the other paths' "user" mode.
+            ts_ns = time.time_ns()
+            if epoch_ns is None:
+                epoch_ns = ts_ns
+            pkt_obj = core.LidarPacket(pkt_size)
+            pkt_obj.buf[:] = np.frombuffer(data, dtype=np.uint8)
+            counters["buffers"] += 1
+            counters["misses"] += 1
+            ts_counts["user"] += 1
+            yield pkt_obj, (ts_ns - epoch_ns) * 1e-9
+
+
+class FrameQueue:
+    """Bounded ingest -> processing hand-off that never blocks the producer.
+
+    When full, `put` evicts the oldest queued frame, counts it in `dropped`
+    and returns it so the caller can recycle its buffers.
+    """
+
+    def __init__(self, maxlen: int) -> None:
+        self.maxlen = max(1, maxlen)
+        self.dropped = 0
+        self._q = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        evicted = None
+        with self._cond:
+            if len(self._q) >= self.maxlen:
+                evicted = self._q.popleft()
+                self.dropped += 1
+            self._q.append(item)
+            self._cond.notify()
+        return evicted
+
+    def get(self, timeout: float):
+        with self._cond:
+            if not self._q:
+                self._cond.wait(timeout)
+            return self._q.popleft() if self._q else None
+
+    def __len__(self) -> int:
+        return len(self._q)
+
+
+frame_queue = FrameQueue(2)
+
+
+class FrameHub:
+    """Fan-out of published frames to streaming clients, one FrameQueue each.
+
+    `publish` only appends a reference to every subscriber's bounded queue,
+    so a slow client costs at most `depth` frames of memory and never blocks
+    the processing thread; stale frames are dropped oldest-first.
+    """
+
+    def __init__(self) -> None:
+        self._clients = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, depth: int = 2) -> FrameQueue:
+        q = FrameQueue(depth)
+        with self._lock:
+            self._clients.add(q)
+        return q
+
+    def unsubscribe(self, q: FrameQueue) -> None:
+        with self._lock:
+            self._clients.discard(q)
+
+    def publish(self, item) -> None:
+        with self._lock:
+            clients = list(self._clients)
+        for q in clients:
+            q.put(item)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+frame_hub = FrameHub()
+stats_hub = FrameHub()
+
+
+class ArrivalRing:
+    """Fixed-size ring of packet arrival times (float64 seconds), one writer.
+
+    Ingest pushes every packet; `seq` counts pushes so a frame is named by
+    its (start, end) sequence range and handed to processing without copying
+    a list. Readers get chronological copies of a sequence range or of the
+    trailing N seconds. The oldest `guard` slots are never returned because
+    the writer may be overwriting them during the copy.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        cap = 1 << max(0, capacity - 1).bit_length()
+        self._buf = np.zeros(cap, dtype=np.float64)
+        self._mask = cap - 1
+        self.capacity = cap
+        self.guard = cap // 8
+        self.seq = 0
+
+    def push(self, t: float) -> None:
+        self._buf[self.seq & self._mask] = t
+        self.seq += 1
+
+    def seq_range(self, start: int, end: int) -> np.ndarray:
+        start = max(start, self.seq - self.capacity + self.guard, 0)
+        n = end - start
+        if n <= 0:
+            return np.empty(0, dtype=np.float64)
+        i0 = start & self._mask
+        if i0 + n <= self.capacity:
+            return self._buf[i0 : i0 + n].copy()
+        return np.concatenate((self._buf[i0:], self._buf[: n - (self.capacity - i0)]))
+
+    def trailing(self, seconds: float, end: int) -> np.ndarray:
+        ts = self.seq_range(0, end)
+        if ts.size == 0:
+            return ts
+        return ts[np.searchsorted(ts, ts[-1] - seconds, side="left") :]
+
+
+# ~25 s of arrivals at 2560 pps, enough for the longest GAP_WINDOWS entry.
+ARRIVAL_RING_SIZE = 1 << 16
+# Trailing windows reported in /api/stats besides the last frame.
+GAP_WINDOWS = {"1s": 1.0, "10s": 10.0}
+BURST_GAP_US = 50.0
+
+
+def gap_stats(ts: np.ndarray) -> dict:
+    """Inter-packet gap statistics (us) over consecutive arrival times."""
+    out = {
+        "packets": int(ts.size),
+        "pps": 0.0,
+        "gap_mean_us": 0.0,
+        "gap_stdev_us": 0.0,
+        "gap_max_us": 0.0,
+        "gap_p50_us": 0.0,
+        "gap_p95_us": 0.0,
+        "gap_p99_us": 0.0,
+        "burst_pct": 0.0,
+    }
+    if ts.size < 3:
+        return out
+    gaps = np.diff(ts) * 1e6
+    p50, p95, p99 = np.percentile(gaps, (50, 95, 99))
+    elapsed = ts[-1] - ts[0]
+    out["pps"] = float(ts.size / elapsed) if elapsed > 0 else 0.0
+    out["gap_mean_us"] = float(gaps.mean())
+    out["gap_stdev_us"] = float(gaps.std(ddof=1))
+    out["gap_max_us"] = float(gaps.max())
+    out["gap_p50_us"] = float(p50)
+    out["gap_p95_us"] = float(p95)
+    out["gap_p99_us"] = float(p99)
+    out["burst_pct"] = float(np.count_nonzero(gaps < BURST_GAP_US)) * 100.0 / gaps.size
+    return out
+
+
+class ScanPool:
+    """Fixed set of LidarScans cycled between the batcher and processing.
+
+    Ingest fills one scan while processing reads another; scans come back
+    via `release` once processing (or queue eviction) is done with them.
+    Sized queue depth + 2 the pool never has to allocate in steady state,
+    which `allocs` makes visible.
+    """
+
+    def __init__(self, factory, depth: int) -> None:
+        self._factory = factory
+        self._free = deque(factory() for _ in range(depth))
+        self._lock = threading.Lock()
+        self.allocs = depth
+
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                return self._free.popleft()
+            self.allocs += 1
+        return self._factory()
+
+    def release(self, scan) -> None:
+        with self._lock:
+            self._free.append(scan)
+
+
+def build_xyz_lut(xyzlut, h: int, w: int, profile) -> tuple[np.ndarray, np.ndarray]:
+    """Flatten an XYZLut into float32 (direction per mm, offset) arrays.
+
+    Derived from two probe ranges rather than LUT internals so it works with
+    any SDK version: xyz = range_mm * direction + offset.
+    """
+    probe = core.LidarScan(h, w, profile)
+    rng = probe.field(core.ChanField.RANGE)
+    rng[:] = 1000
+    xyz_a = xyzlut(probe).reshape(-1, 3)
+    rng[:] = 2000
+    xyz_b = xyzlut(probe).reshape(-1, 3)
+    direction = (xyz_b - xyz_a) / 1000.0
+    offset = xyz_a - 1000.0 * direction
+    return direction.astype(np.float32), offset.astype(np.float32)
+
+
+def project_valid_points(scan, lut: tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """XYZ (float32, metres) for pixels whose RANGE is inside the valid window."""
+    rng = scan.field(core.ChanField.RANGE).reshape(-1)
+    idx = np.flatnonzero((rng > RANGE_MIN_MM) & (rng < RANGE_MAX_MM))
+    direction, offset = lut
+    r = rng[idx].astype(np.float32)
+    return direction[idx] * r[:, None] + offset[idx]
+
+
+def column_status_offsets(pf) -> np.ndarray:
+    """Byte offset of each column's (low) status byte inside a lidar packet."""
+    if pf.col_footer_size:
+        # LEGACY: 32-bit status word in the column footer.
+        off = pf.col_size - pf.col_footer_size
+    else:
+        # Column header: timestamp u64, measurement_id u16, status u16.
+        off = pf.col_header_size - 2
+    return pf.packet_header_size + np.arange(pf.columns_per_packet) * pf.col_size + off
+
+
+def column_timestamp_offsets(pf) -> np.ndarray:
+    """Byte offset of each column's u64 timestamp (ns, sensor clock); first in every column layout."""
+    return pf.packet_header_size + np.arange(pf.columns_per_packet) * pf.col_size
+
+
+def column_timestamps(buf, offsets: np.ndarray) -> np.ndarray:
+    return np.frombuffer(buf, dtype=np.uint8).reshape(-1)[offsets[:, None] + np.arange(8)].copy().view("<u8").reshape(-1)
+
+
+def sensor_ts_range(ts: np.ndarray) -> tuple[int, int]:
+    """(first, last) nonzero column timestamp in ns, (0, 0) if no column was stamped."""
+    ts = ts[ts != 0]
+    return (int(ts.min()), int(ts.max())) if ts.size else (0, 0)
+
+
+class HeaderFrameCounter:
+    """ScanBatcher stand-in for --stats-only ingest.
+
+    Follows frame boundaries via the packet frame_id and counts valid columns
+    from the column status bits, without decoding any channel data. Like
+    ScanBatcher, calling it with the first packet of a new frame returns True
+    and leaves the finished frame's totals in `valid_cols`.
+    """
+
+    def __init__(self, pf, w: int) -> None:
+        self._pf = pf
+        self._w = w
+        self._status_idx = column_status_offsets(pf)
+        self._ts_idx = column_timestamp_offsets(pf)
+        self._frame_id = None
+        self._cur_valid = 0
+        self._cur_ts = (0, 0)
+        self.valid_cols = 0
+        self.sensor_ts = (0, 0)
+
+    def _merge_ts(self, ts: tuple[int, int]) -> tuple[int, int]:
+        if not self._cur_ts[0]:
+            return ts
+        if not ts[0]:
+            return self._cur_ts
+        return min(self._cur_ts[0], ts[0]), max(self._cur_ts[1], ts[1])
+
+    def __call__(self, buf) -> bool:
+        fid = self._pf.frame_id(buf)
+        valid = int(np.count_nonzero(buf[self._status_idx] & 1))
+        ts = sensor_ts_range(column_timestamps(buf, self._ts_idx))
+        if self._frame_id is None or fid == self._frame_id:
+            self._frame_id = fid
+            self._cur_valid += valid
+            self._cur_ts = self._merge_ts(ts)
+            return False
+        self.valid_cols = min(self._w, self._cur_valid)
+        self.sensor_ts = self._cur_ts
+        self._frame_id = fid
+        self._cur_valid = valid
+        self._cur_ts = ts
+        return True
+
+
 def lidar_thread(host: str, port: int) -> None:
-    global latest_points, latest_motion_points, latest_tracks, latest_frame_id
-    global running, lidar_connected, force_reconnect, current_stats
+    """Ingest stage: receive packets and batch them into scans, nothing else."""
+    global running, lidar_connected, force_reconnect, ingest_frame_seq
 
     while running:
         lidar_connected = False
@@ -324,118 +940,301 @@ def lidar_thread(host: str, port: int) -> None:
             fetch_lidar_config(host)
 
             pf = core.PacketFormat.from_info(info)
-            batcher = core.ScanBatcher(info)
-            xyzlut = core.XYZLut(info)
+            stats_only = ingest_cfg["stats_only"]
+            batcher = None if stats_only else core.ScanBatcher(info)
 
             w = info.format.columns_per_frame
             h = info.format.pixels_per_column
             pkt_size = pf.lidar_packet_size
+            xyz_lut = None
+            if not stats_only:
+                xyz_lut = build_xyz_lut(core.XYZLut(info), h, w, info.format.udp_profile_lidar)
+            pixel_shift = np.asarray(info.format.pixel_shift_by_row, dtype=np.int64)
+            sensor_key = f"{info.sn}_{lidar_state['mode']}"
+            if bg_store is not None:
+                # Every voxel scale of this sensor/mode, read while the socket comes up,
+                # so snapshot swaps on the processing thread never wait on disk.
+                bg_store.prefetch(f"{sensor_key}_")
 
             sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+            # Before bind: datagrams queued earlier would be stamped at read time.
+            if ingest_cfg["mode"] != "copy":
+                enable_rx_timestamps(sock, ingest_cfg["ts_mode"])
             sock.bind(("0.0.0.0", port))
             sock.settimeout(1.0)
+            if ingest_cfg["ts_iface"] and not enable_nic_hw_timestamps(sock, ingest_cfg["ts_iface"]):
+                print(f"SIOCSHWTSTAMP failed on {ingest_cfg['ts_iface']}; NIC stamps only if already enabled")
+            drops = KernelDropCounter(sock)
+            drops_last = 0
             lidar_connected = True
 
-            scan = core.LidarScan(h, w, info.format.udp_profile_lidar)
-            frame_times = deque(maxlen=20)
-            last_time = time.time()
-            pkt_timestamps = []
-
-            while running and not force_reconnect:
-                try:
-                    data, _ = sock.recvfrom(65535)
-                except socket.timeout:
+            if stats_only:
+                header_counter = HeaderFrameCounter(pf, w)
+                scan_pool = None
+                scan = None
+            else:
+                scan_pool = ScanPool(
+                    lambda: core.LidarScan(h, w, info.format.udp_profile_lidar),
+                    frame_queue.maxlen + 2,
+                )
+                scan = scan_pool.acquire()
+            arrivals = ArrivalRing(ARRIVAL_RING_SIZE)
+            frame_seq_start = 0
+
+            counters = {
+                "buffers": 0,
+                "misses": 0,
+                "syscalls": 0,
+                "pkts": 0,
+                "ts_mismatch": 0,
+                "ts_sources": Counter(),
+            }
+            frame_ts_start = Counter()
+            frame_misses_start = 0
+            frame_pkts_start = 0
+            frame_syscalls_start = 0
+
+            for pkt_obj, rx_ts in iter_lidar_packets(sock, pkt_size, counters, drops):
+                counters["pkts"] += 1
+                if rx_ts is not None:
+                    arrivals.push(rx_ts)
+                if stats_only:
+                    if not header_counter(pkt_obj.buf):
+                        continue
+                elif not batcher(pkt_obj, scan):
                     continue
 
-                if len(data) != pkt_size:
-                    continue
+                drops_total = drops.total()
+                n_pkts = counters["pkts"] - frame_pkts_start
+                ingest_frame_seq += 1
+                evicted = frame_queue.put(
+                    {
+                        "seq": ingest_frame_seq,
+                        "scan": scan,
+                        "scan_pool": scan_pool,
+                        "valid_cols": header_counter.valid_cols if stats_only else None,
+                        "sensor_ts": header_counter.sensor_ts if stats_only else None,
+                        "xyz_lut": xyz_lut,
+                        "h": h,
+                        "pixel_shift": pixel_shift,
+                        "sensor_key": sensor_key,
+                        "w": w,
+                        "t_done": time.time(),
+                        "arrivals": arrivals,
+                        "pkt_seq": (frame_seq_start, arrivals.seq),
+                        "n_pkts": n_pkts,
+                        "ts_mismatch_total": counters["ts_mismatch"],
+                        "ingest_pkt_buffers": counters["buffers"],
+                        "pool_misses_per_pkt": (counters["misses"] - frame_misses_start) / max(1, n_pkts),
+                        "ingest_pkts_per_syscall": n_pkts / max(1, counters["syscalls"] - frame_syscalls_start),
+                        "scan_allocs": scan_pool.allocs if scan_pool is not None else 0,
+                        "kernel_drops_total": drops_total,
+                        "kernel_drops_window": drops_total - drops_last,
+                        "kernel_drops_source": drops.source,
+                        "clock_source": clock_source_label(counters["ts_sources"] - frame_ts_start),
+                    }
+                )
+                if evicted is not None and evicted["scan"] is not None:
+                    evicted["scan_pool"].release(evicted["scan"])
+
+                drops_last = drops_total
+                frame_seq_start = arrivals.seq
+                frame_pkts_start = counters["pkts"]
+                frame_misses_start = counters["misses"]
+                frame_syscalls_start = counters["syscalls"]
+                frame_ts_start = counters["ts_sources"].copy()
+                if scan_pool is not None:
+                    scan = scan_pool.acquire()
 
-                pkt_timestamps.append(time.perf_counter())
+            force_reconnect = False
+            sock.close()
 
-                pkt_obj = core.LidarPacket(pkt_size)
-                pkt_obj.buf[:] = np.frombuffer(data, dtype=np.uint8)
-                done = batcher(pkt_obj, scan)
+        except Exception as e:
+            lidar_connected = False
+            print(f"LiDAR thread error: {e}")
 
-                if not done:
-                    continue
+        if running:
+            time.sleep(1.0)
 
-                xyz = xyzlut(scan)
-                status = scan.status
-                valid_cols = int(np.count_nonzero(status))
 
-                xyz_flat = xyz.reshape(-1, 3)
-                d = np.linalg.norm(xyz_flat, axis=1)
-                valid = (d > 0.3) & (d < 100)
-                xyz_valid = xyz_flat[valid]
+def xyz_requested() -> bool:
+    t = xyz_demand["t"] if data_plane is None else max(xyz_demand["t"], data_plane.demand_t)
+    return time.time() - t < XYZ_DEMAND_S
+
+
+def set_lut(version: int, lut: tuple[np.ndarray, np.ndarray], h: int, w: int) -> None:
+    """Main process only, so the shared LUT has a single writer (see data_plane_reader)."""
+    with lock:
+        lut_state.update(version=version, lut=lut, h=h, w=w)
+    if data_plane is not None:
+        data_plane.write_lut(version, h, w, lut)
+
+
+def set_latest_frame(
+    fid: int, xyz: np.ndarray, mpts: np.ndarray, tracks: list[dict], range_img: np.ndarray | None, lut_version: int
+) -> None:
+    """Make a frame the one the endpoints serve and push it to stream clients."""
+    global latest_points, latest_motion_points, latest_tracks, latest_frame_id
+    with lock:
+        latest_points = xyz
+        latest_motion_points = mpts
+        latest_tracks = tracks
+        latest_frame_id = fid
+    frame_hub.publish((fid, xyz, mpts, tracks, range_img, lut_version))
+
+
+def publish_stats_record(record: dict) -> None:
+    """Encode a per-frame stats record once as an SSE event and fan it out."""
+    data = json.dumps(record, separators=(",", ":"))
+    event = (record["seq"], f"id: {record['seq']}\nevent: stats\ndata: {data}\n\n".encode())
+    with lock:
+        stats_history.append(event)
+    stats_hub.publish(event)
+
 
-                moving_pts = np.empty((0, 3), dtype=np.float32)
-                tracks = []
+def processing_thread() -> None:
+    """Processing stage: XYZ, motion and stats for frames handed over by ingest."""
+    global current_stats
+
+    frame_times = deque(maxlen=20)
+    last_time = None
+
+    while running:
+        frame = frame_queue.get(1.0)
+        if frame is None:
+            continue
+        try:
+            scan = frame["scan"]
+            w = frame["w"]
+            arrivals = frame["arrivals"]
+            seq_start, seq_end = frame["pkt_seq"]
+
+            moving_pts = np.empty((0, 3), dtype=np.float32)
+            tracks = []
+            motion_ms = 0.0
+            range_img = None
+            xyz_valid = np.empty((0, 3), dtype=np.float32)
+            if scan is None:
+                valid_cols = frame["valid_cols"]
+                sensor_ts = frame["sensor_ts"]
+                n_points = 0
+            else:
+                status = scan.status
+                valid_cols = int(np.count_nonzero(status))
+                sensor_ts = sensor_ts_range(scan.timestamp[status != 0])
+                if frame["xyz_lut"] is not lut_state["lut"]:
+                    set_lut(lut_state["version"] + 1, frame["xyz_lut"], frame["h"], frame["w"])
+                # Copied: the scan goes back to the pool once this frame is done.
+                range_img = scan.field(core.ChanField.RANGE).copy()
+                need_xyz = (motion_cfg["enabled"] and motion_cfg["backend"] == "voxel") or xyz_requested()
+                if need_xyz:
+                    xyz_valid = project_valid_points(scan, frame["xyz_lut"])
+                    n_points = int(xyz_valid.shape[0])
+                else:
+                    n_points = int(np.count_nonzero((range_img > RANGE_MIN_MM) & (range_img < RANGE_MAX_MM)))
+
+                t_motion = time.perf_counter()
                 if motion_cfg["enabled"]:
+                    sync_motion_snapshot(frame)
+                if motion_cfg["enabled"] and motion_cfg["backend"] == "range_image":
+                    moving_pts, tracks = detect_motion_range_image(scan, frame)
+                elif motion_cfg["enabled"]:
                     moving_pts, tracks = detect_motion(xyz_valid)
-
-                now = time.time()
+                if motion_cfg["enabled"]:
+                    tracks = _tracker.update(tracks, frame["t_done"])
+                motion_ms = (time.perf_counter() - t_motion) * 1000.0
+                if motion_cfg["adaptive"] and motion_cfg["backend"] == "voxel":
+                    _decimation.observe(motion_ms)
+            track_latency_ms = (time.time() - frame["t_done"]) * 1000.0
+
+            now = frame["t_done"]
+            if last_time is not None:
                 frame_times.append(now - last_time)
-                last_time = now
-                fps = 1.0 / (sum(frame_times) / len(frame_times)) if frame_times else 0.0
-
-                gap_mean = 0.0
-                gap_stdev = 0.0
-                gap_max = 0.0
-                burst_pct = 0.0
-                pps = 0.0
-                if len(pkt_timestamps) > 2:
-                    gaps = [(pkt_timestamps[i + 1] - pkt_timestamps[i]) * 1e6 for i in range(len(pkt_timestamps) - 1)]
-                    gap_mean = statistics.mean(gaps)
-                    gap_stdev = statistics.stdev(gaps) if len(gaps) > 1 else 0.0
-                    gap_max = max(gaps)
-                    burst_pct = sum(1 for g in gaps if g < 50.0) / len(gaps) * 100.0
-                    elapsed = pkt_timestamps[-1] - pkt_timestamps[0]
-                    pps = len(pkt_timestamps) / elapsed if elapsed > 0 else 0.0
-
-                completeness = valid_cols / w if w else 0.0
-                motion_points = int(moving_pts.shape[0])
-                motion_ratio = motion_points / max(1, int(xyz_valid.shape[0]))
-
-                raw = {
-                    "fps": fps,
-                    "frame_completeness": completeness,
-                    "valid_cols": valid_cols,
-                    "total_cols": w,
-                    "points_per_frame": int(xyz_valid.shape[0]),
-                    "pkts_per_frame": len(pkt_timestamps),
-                    "pps": pps,
-                    "gap_mean_us": gap_mean,
-                    "gap_stdev_us": gap_stdev,
-                    "gap_max_us": gap_max,
-                    "burst_pct": burst_pct,
-                    "motion_points": motion_points,
-                    "motion_ratio": motion_ratio,
-                    "moving_objects": len(tracks),
-                }
-                current_stats = raw
-                for k, v in raw.items():
+            last_time = now
+            fps = 1.0 / (sum(frame_times) / len(frame_times)) if frame_times else 0.0
+
+            gaps = gap_stats(arrivals.seq_range(seq_start, seq_end))
+            windows = {"frame": gaps}
+            for name, seconds in GAP_WINDOWS.items():
+                windows[name] = gap_stats(arrivals.trailing(seconds, seq_end))
+
+            completeness = valid_cols / w if w else 0.0
+            motion_points = int(moving_pts.shape[0])
+            motion_ratio = motion_points / max(1, n_points)
+
+            raw = {
+                "fps": fps,
+                "frame_completeness": completeness,
+                "valid_cols": valid_cols,
+                "total_cols": w,
+                "points_per_frame": n_points,
+                "pkts_per_frame": frame["n_pkts"],
+                "pps": gaps["pps"],
+                "gap_mean_us": gaps["gap_mean_us"],
+                "gap_stdev_us": gaps["gap_stdev_us"],
+                "gap_max_us": gaps["gap_max_us"],
+                "gap_p50_us": gaps["gap_p50_us"],
+                "gap_p95_us": gaps["gap_p95_us"],
+                "gap_p99_us": gaps["gap_p99_us"],
+                "burst_pct": gaps["burst_pct"],
+                "motion_points": motion_points,
+                "motion_ratio": motion_ratio,
+                "moving_objects": len(tracks),
+                "tracks_alive": len(_tracker),
+                "track_latency_ms": track_latency_ms,
+                "motion_ms": motion_ms,
+                "motion_level": _decimation.level,
+                "ingest_pkt_buffers": frame["ingest_pkt_buffers"],
+                "pool_misses_per_pkt": frame["pool_misses_per_pkt"],
+                "ingest_pkts_per_syscall": frame["ingest_pkts_per_syscall"],
+                "proc_queue_depth": len(frame_queue),
+                "proc_frames_dropped": frame_queue.dropped,
+                "proc_latency_ms": (time.time() - frame["t_done"]) * 1000.0,
+                "scan_allocs": frame["scan_allocs"],
+                "kernel_drops_total": frame["kernel_drops_total"],
+                "kernel_drops_window": frame["kernel_drops_window"],
+                "ts_mismatch_total": frame["ts_mismatch_total"],
+            }
+            current_stats = raw
+            ingest_state["kernel_drops_source"] = frame["kernel_drops_source"]
+            ingest_state["clock_source"] = frame["clock_source"]
+            for k, v in raw.items():
+                if k in COUNTER_STATS:
+                    smoothed_stats[k] = v
+                else:
                     smoothed_stats[k] = EMA_ALPHA * v + (1.0 - EMA_ALPHA) * smoothed_stats.get(k, v)
 
-                with lock:
-                    latest_points = xyz_valid.tolist()
-                    latest_motion_points = moving_pts.tolist() if moving_pts.size else []
-                    latest_tracks = tracks
-                    latest_frame_id += 1
-
-                pkt_timestamps = []
-                scan = core.LidarScan(h, w, info.format.udp_profile_lidar)
-
-            force_reconnect = False
-            sock.close()
+            with lock:
+                gap_windows.update(windows)
+            fid = frame["seq"]
+            rx = arrivals.seq_range(seq_start, seq_end)
+            publish_stats_record(
+                {
+                    "seq": fid,
+                    "boot_id": BOOT_ID,
+                    "t_host": time.time(),
+                    "t_frame_done": frame["t_done"],
+                    "rx_first_s": float(rx[0]) if rx.size else 0.0,
+                    "rx_last_s": float(rx[-1]) if rx.size else 0.0,
+                    "sensor_ts_first_ns": sensor_ts[0],
+                    "sensor_ts_last_ns": sensor_ts[1],
+                    "sensor_key": frame["sensor_key"],
+                    "clock_source": frame["clock_source"],
+                    **raw,
+                }
+            )
+            set_latest_frame(fid, xyz_valid, moving_pts, tracks, range_img, lut_state["version"])
+            if data_plane is not None:
+                meta = json.dumps({"tracks": tracks, "stats": stats_snapshot(), "t": time.time()}, separators=(",", ":"))
+                data_plane.write(fid, xyz_valid, moving_pts, range_img, lut_state["version"], meta.encode())
 
         except Exception as e:
-            lidar_connected = False
-            print(f"LiDAR thread error: {e}")
-
-        if running:
-            time.sleep(1.0)
+            print(f"processing thread error: {e}")
+        finally:
+            if frame["scan"] is not None:
+                frame["scan_pool"].release(frame["scan"])
 
 
 HTML_TEMPLATE = """
@@ -487,6 +1286,12 @@ button.warn { background:#3a2e18; border-color:#735a26; }
       <div class=\"h\">Motion Tracking (Background Subtraction)</div>
       <div class=\"row\"><button class=\"warn\" onclick=\"resetBackground()\">Reset Background</button></div>
       <div class=\"row\"><button onclick=\"toggleMotionOnly()\">Toggle Motion-Only View</button></div>
+      <div class=\"row\">
+        <select id=\"transportSel\" onchange=\"setTransport()\">
+          <option value=\"xyz\">Transport: XYZ (q16d)</option>
+          <option value=\"range\">Transport: range image + GPU LUT</option>
+        </select>
+      </div>
       <div class=\"kv\" id=\"trackList\"></div>
     </div>
 
@@ -540,20 +1345,21 @@ function init3d() {
   })();
 }
 
-function updateCloud(points, isMotion) {
-  const n = points.length;
+// xyz: flat Float32Array (x, y, z per point) straight from /api/points.bin.
+function updateCloud(xyz, isMotion) {
+  const n = xyz.length / 3;
   if (!n) return;
   const pos = new Float32Array(n * 3);
   const col = new Float32Array(n * 3);
   for (let i = 0; i < n; i++) {
-    const p = points[i];
-    pos[i*3] = p[0];
-    pos[i*3+1] = p[2];
-    pos[i*3+2] = p[1];
+    const z = xyz[i*3+2];
+    pos[i*3] = xyz[i*3];
+    pos[i*3+1] = z;
+    pos[i*3+2] = xyz[i*3+1];
     if (isMotion) {
       col[i*3] = 1.0; col[i*3+1] = 0.3; col[i*3+2] = 0.2;
     } else {
-      const h = Math.max(0, Math.min(1, (p[2] + 2) / 6));
+      const h = Math.max(0, Math.min(1, (z + 2) / 6));
       col[i*3] = 0.2 + 0.6*h;
       col[i*3+1] = 0.4 + 0.4*(1-h);
       col[i*3+2] = 0.8 - 0.5*h;
@@ -563,9 +1369,13 @@ function updateCloud(points, isMotion) {
   cloud.geometry.setAttribute('color', new THREE.BufferAttribute(col, 3));
 }
 
+// Point/stream endpoints: same origin, or the data-plane process (--data-port).
+let DATA_BASE = '';
+
 async function refreshModes() {
   const r = await fetch('/api/lidar/config');
   const d = await r.json();
+  DATA_BASE = d.data_port ? `${location.protocol}//${location.hostname}:${d.data_port}` : '';
   const sel = document.getElementById('modeSel');
   sel.innerHTML = '';
   (d.supported_modes || []).forEach(m => {
@@ -615,46 +1425,295 @@ async function applyThreeSlot() {
   document.getElementById('gateMsg').textContent = d.ok ? d.desc : `Failed: ${d.error || 'unknown'}`;
 }
 
+// Layout must match POINTS_HEADER / pack_points_frame on the server.
+function decodePoints(buf) {
+  const dv = new DataView(buf);
+  if (dv.getUint32(0, true) !== 0x3150544c) throw new Error('bad points magic');  // "LTP1"
+  const frameId = dv.getUint32(4, true);
+  const nPts = dv.getUint32(8, true);
+  const nMotion = dv.getUint32(12, true);
+  const jsonLen = dv.getUint32(16, true);
+  const meta = JSON.parse(new TextDecoder().decode(new Uint8Array(buf, 20, jsonLen)));
+  const off = 20 + ((jsonLen + 3) & ~3);
+  return {
+    frame_id: frameId,
+    meta,
+    points: new Float32Array(buf, off, nPts * 3),
+    motion_points: new Float32Array(buf, off + nPts * 12, nMotion * 3),
+  };
+}
+
+function render(p, tracks, s) {
+  const points = motionOnly ? p.motion_points : p.points;
+  cloud.visible = true;
+  if (rangeCloud) rangeCloud.visible = false;
+  if (p.frame_id !== currentFrame && points.length) {
+    updateCloud(points, motionOnly);
+    currentFrame = p.frame_id;
+  }
+  renderInfo(tracks, s);
+}
+
+// Streams carry stats only with frames; when frames stop (sensor gone, gate
+// closed) take them from the main server so the UI never shows a stale live sensor.
+let lastInfoT = 0;
+setInterval(async () => {
+  if (!streamCtl || performance.now() - lastInfoT < 2000) return;
+  try { renderInfo([], await (await fetch('/api/stats')).json()); } catch (_) {}
+}, 1000);
+
+function renderInfo(tracks, s) {
+  lastInfoT = performance.now();
+  document.getElementById('liveDot').className = 'dot ' + (s.connected ? 'live' : '');
+
+  const kv = document.getElementById('statsKv');
+  kv.innerHTML = `
+    <div class='k'>mode</div><div>${s.lidar_mode || '-'}</div>
+    <div class='k'>fps</div><div>${(s.fps||0).toFixed(2)}</div>
+    <div class='k'>completeness</div><div>${((s.frame_completeness||0)*100).toFixed(2)}%</div>
+    <div class='k'>pps</div><div>${Math.round(s.pps||0)}</div>
+    <div class='k'>gap std</div><div>${(s.gap_stdev_us||0).toFixed(1)} us</div>
+    <div class='k'>motion points</div><div>${Math.round(s.motion_points||0)}</div>
+    <div class='k'>moving objects</div><div>${Math.round(s.moving_objects||0)}</div>
+    <div class='k'>track latency</div><div>${(s.track_latency_ms||0).toFixed(1)} ms</div>
+    <div class='k'>bg ready</div><div>${s.bg_ready ? 'yes' : 'building'}</div>
+  `;
+
+  const t = document.getElementById('trackList');
+  if (!tracks.length) {
+    t.innerHTML = "<div class='k'>tracks</div><div>none</div>";
+  } else {
+    t.innerHTML = tracks.map(x =>
+      `<div class='track'>#${x.id} pts=${x.points} center=(${x.centroid.map(v => v.toFixed(2)).join(', ')}) v=${(x.speed_mps||0).toFixed(2)} m/s age=${x.age||0}</div>`
+    ).join('');
+  }
+}
+
+// LTQ1 (lidar_pointcodec): int16 xyz * scale + offset, optional row delta and deflate.
+async function decodeQuantized(buf) {
+  const dv = new DataView(buf);
+  const n = dv.getUint32(8, true);
+  const nMotion = dv.getUint32(12, true);
+  const jsonLen = dv.getUint32(16, true);
+  const flags = dv.getUint32(20, true);
+  const scale = dv.getFloat32(24, true);
+  const o = [dv.getFloat32(28, true), dv.getFloat32(32, true), dv.getFloat32(36, true)];
+  let body = new Uint8Array(buf, 40);
+  if (flags & 4) throw new Error('zstd packets are not decoded in the browser');
+  if (flags & 2) {
+    const inflated = new Blob([body]).stream().pipeThrough(new DecompressionStream('deflate'));
+    body = new Uint8Array(await new Response(inflated).arrayBuffer());
+  }
+  const meta = JSON.parse(new TextDecoder().decode(body.subarray(0, jsonLen)));
+  const q = new Int16Array(body.buffer, body.byteOffset + ((jsonLen + 3) & ~3), (n + nMotion) * 3);
+  const toXyz = (start, count) => {
+    const out = new Float32Array(count * 3);
+    const prev = [0, 0, 0];
+    for (let i = 0; i < count * 3; i++) {
+      const c = i % 3;
+      const v = (flags & 1) ? ((prev[c] + q[start + i]) << 16) >> 16 : q[start + i];
+      prev[c] = v;
+      out[i] = v * scale + o[c];
+    }
+    return out;
+  };
+  return {
+    frame_id: dv.getUint32(4, true),
+    meta,
+    points: toXyz(0, n),
+    motion_points: toXyz(n * 3, nMotion),
+  };
+}
+
+async function decodeFrame(buf) {
+  const magic = new DataView(buf).getUint32(0, true);
+  return magic === 0x3151544c ? decodeQuantized(buf) : decodePoints(buf);  // "LTQ1" : "LTP1"
+}
+
+// Quantized + delta, deflated in the packet when the browser can inflate it.
+const POINT_QUERY = 'max=32768&enc=q16d' + ('DecompressionStream' in window ? '&comp=deflate' : '');
+
+// Fallback when streaming is unavailable (old browser, proxy buffering):
+// poll LTQ1/LTP1 snapshots until startStream's retry gets a stream going again.
+let polling = false;
+
+function startPolling() {
+  if (!polling) { polling = true; poll(); }
+}
+
 async function poll() {
+  if (streamCtl) { polling = false; return; }  // a stream was (re)started; stop the fallback loop
   try {
-    const [pRes, sRes] = await Promise.all([fetch('/api/points?max=32768'), fetch('/api/stats')]);
-    const p = await pRes.json();
-    const s = await sRes.json();
-    document.getElementById('liveDot').className = 'dot ' + (s.connected ? 'live' : '');
-
-    const points = motionOnly ? (p.motion_points || []) : (p.points || []);
-    if (p.frame_id !== currentFrame && points.length) {
-      updateCloud(points, motionOnly);
-      currentFrame = p.frame_id;
+    const [pRes, sRes] = await Promise.all([fetch(DATA_BASE + '/api/points.bin?' + POINT_QUERY), fetch('/api/stats')]);
+    const p = await decodeFrame(await pRes.arrayBuffer());
+    render(p, p.meta || [], await sRes.json());
+  } catch (_) {}
+  setTimeout(poll, 250);
+}
+
+// Stream framing shared by /api/stream.bin and /api/range.bin:
+// (length, dropped) uint32 prefix + one packet, one message per new frame.
+async function readMessages(url, signal, onMessage) {
+  const res = await fetch(DATA_BASE + url, { signal });
+  if (!res.ok || !res.body) throw new Error('stream unavailable');
+  const reader = res.body.getReader();
+  let buf = new Uint8Array(0);
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) throw new Error('stream closed');
+    const merged = new Uint8Array(buf.length + value.length);
+    merged.set(buf);
+    merged.set(value, buf.length);
+    buf = merged;
+    while (buf.length >= 8) {
+      const len = new DataView(buf.buffer, buf.byteOffset, 8).getUint32(0, true);
+      if (buf.length < 8 + len) break;
+      // slice() copies into a fresh ArrayBuffer, keeping the typed-array views aligned.
+      const msg = buf.slice(8, 8 + len).buffer;
+      buf = buf.slice(8 + len);
+      await onMessage(msg);
     }
+  }
+}
 
-    const kv = document.getElementById('statsKv');
-    kv.innerHTML = `
-      <div class='k'>mode</div><div>${s.lidar_mode || '-'}</div>
-      <div class='k'>fps</div><div>${(s.fps||0).toFixed(2)}</div>
-      <div class='k'>completeness</div><div>${((s.frame_completeness||0)*100).toFixed(2)}%</div>
-      <div class='k'>pps</div><div>${Math.round(s.pps||0)}</div>
-      <div class='k'>gap std</div><div>${(s.gap_stdev_us||0).toFixed(1)} us</div>
-      <div class='k'>motion points</div><div>${Math.round(s.motion_points||0)}</div>
-      <div class='k'>moving objects</div><div>${Math.round(s.moving_objects||0)}</div>
-      <div class='k'>bg ready</div><div>${s.bg_ready ? 'yes' : 'building'}</div>
-    `;
-
-    const t = document.getElementById('trackList');
-    const tracks = p.tracks || [];
-    if (!tracks.length) {
-      t.innerHTML = "<div class='k'>tracks</div><div>none</div>";
+function streamFrames(signal) {
+  return readMessages('/api/stream.bin?' + POINT_QUERY, signal, async msg => {
+    const p = await decodeFrame(msg);
+    render(p, p.meta.tracks || [], p.meta.stats || {});
+  });
+}
+
+// ---- Range-image transport: LTR1 packets + LTL1 LUT, XYZ rebuilt on the GPU.
+let rangeCloud = null;
+let lutVersion = -1;
+
+const RANGE_VERTEX = `
+attribute vec3 offset;
+attribute float range;
+uniform float unitMm;
+uniform float size;
+uniform float scale;
+varying vec3 vColor;
+void main() {
+  if (range <= 0.0) {
+    gl_Position = vec4(2.0, 2.0, 2.0, 1.0);  // no return: outside the clip volume
+    gl_PointSize = 0.0;
+    return;
+  }
+  vec3 p = position * (range * unitMm) + offset;  // position = LUT direction per mm
+  float h = clamp((p.z + 2.0) / 6.0, 0.0, 1.0);
+  vColor = vec3(0.2 + 0.6 * h, 0.4 + 0.4 * (1.0 - h), 0.8 - 0.5 * h);
+  vec4 mv = modelViewMatrix * vec4(p.x, p.z, p.y, 1.0);
+  gl_PointSize = size * scale / -mv.z;
+  gl_Position = projectionMatrix * mv;
+}`;
+const RANGE_FRAGMENT = `
+varying vec3 vColor;
+void main() { gl_FragColor = vec4(vColor, 1.0); }`;
+
+async function loadLut() {
+  const buf = await (await fetch(DATA_BASE + '/api/lut.bin')).arrayBuffer();
+  const dv = new DataView(buf);
+  if (dv.getUint32(0, true) !== 0x314c544c) throw new Error('bad lut magic');  // "LTL1"
+  const n = dv.getUint16(8, true) * dv.getUint16(10, true);
+  const g = new THREE.BufferGeometry();
+  g.setAttribute('position', new THREE.BufferAttribute(new Float32Array(buf, 12, n * 3), 3));
+  g.setAttribute('offset', new THREE.BufferAttribute(new Float32Array(buf, 12 + n * 12, n * 3), 3));
+  g.setAttribute('range', new THREE.BufferAttribute(new Float32Array(n), 1));
+  const mat = new THREE.ShaderMaterial({
+    uniforms: { unitMm: { value: 1 }, size: { value: 0.06 }, scale: { value: renderer.domElement.height / 2 } },
+    vertexShader: RANGE_VERTEX,
+    fragmentShader: RANGE_FRAGMENT,
+  });
+  if (rangeCloud) { scene.remove(rangeCloud); rangeCloud.geometry.dispose(); rangeCloud.material.dispose(); }
+  rangeCloud = new THREE.Points(g, mat);
+  rangeCloud.frustumCulled = false;
+  scene.add(rangeCloud);
+  lutVersion = dv.getUint32(4, true);
+}
+
+async function decodeRange(buf) {
+  const dv = new DataView(buf);
+  const h = dv.getUint16(12, true);
+  const w = dv.getUint16(14, true);
+  const flags = dv.getUint16(18, true);
+  const jsonLen = dv.getUint32(20, true);
+  const nMotion = dv.getUint32(24, true);
+  let body = new Uint8Array(buf, 28);
+  if (flags & 4) throw new Error('zstd packets are not decoded in the browser');
+  if (flags & 2) {
+    const inflated = new Blob([body]).stream().pipeThrough(new DecompressionStream('deflate'));
+    body = new Uint8Array(await new Response(inflated).arrayBuffer());
+  }
+  const meta = JSON.parse(new TextDecoder().decode(body.subarray(0, jsonLen)));
+  const off = (jsonLen + 3) & ~3;
+  const bytes = (flags & 8) ? 2 : 4;
+  const Pix = bytes === 2 ? Uint16Array : Uint32Array;
+  const motionOff = off + ((h * w * bytes + 3) & ~3);
+  return {
+    frame_id: dv.getUint32(4, true),
+    lut_version: dv.getUint32(8, true),
+    unit_mm: dv.getUint16(16, true),
+    meta,
+    range: new Pix(body.buffer, body.byteOffset + off, h * w),
+    motion_points: new Float32Array(body.buffer, body.byteOffset + motionOff, nMotion * 3),
+  };
+}
+
+function streamRange(signal) {
+  const comp = 'DecompressionStream' in window ? 'deflate' : 'none';
+  return readMessages('/api/range.bin?bits=16&comp=' + comp, signal, async msg => {
+    const p = await decodeRange(msg);
+    if (p.lut_version !== lutVersion) await loadLut();
+    if (motionOnly) {
+      rangeCloud.visible = false;
+      cloud.visible = true;
+      if (p.motion_points.length) updateCloud(p.motion_points, true);
     } else {
-      t.innerHTML = tracks.map(x =>
-        `<div class='track'>#${x.id} pts=${x.points} center=(${x.centroid.map(v => v.toFixed(2)).join(', ')})</div>`
-      ).join('');
+      const attr = rangeCloud.geometry.getAttribute('range');
+      attr.array.set(p.range);
+      attr.needsUpdate = true;
+      rangeCloud.material.uniforms.unitMm.value = p.unit_mm;
+      rangeCloud.visible = true;
+      cloud.visible = false;
     }
-  } catch (_) {}
-  setTimeout(poll, 250);
+    currentFrame = p.frame_id;
+    renderInfo(p.meta.tracks || [], p.meta.stats || {});
+  });
+}
+
+let transport = 'xyz';
+let streamCtl = null;
+const STREAM_RETRY_MIN_MS = 1000;
+const STREAM_RETRY_MAX_MS = 30000;
+let streamRetryMs = STREAM_RETRY_MIN_MS;
+let streamRetryTimer = null;
+
+function startStream() {
+  clearTimeout(streamRetryTimer);
+  if (streamCtl) streamCtl.abort();
+  const ctl = streamCtl = new AbortController();
+  const run = transport === 'range' ? streamRange : streamFrames;
+  const started = performance.now();
+  // Failed or ended: poll meanwhile and reopen the stream with backoff.
+  run(ctl.signal).catch(() => {}).then(() => {
+    if (streamCtl !== ctl) return;  // replaced by a newer stream
+    streamCtl = null;
+    // A stream that ran for a while dropped rather than never working.
+    if (performance.now() - started > 10 * STREAM_RETRY_MIN_MS) streamRetryMs = STREAM_RETRY_MIN_MS;
+    startPolling();
+    streamRetryTimer = setTimeout(startStream, streamRetryMs);
+    streamRetryMs = Math.min(2 * streamRetryMs, STREAM_RETRY_MAX_MS);
+  });
+}
+
+function setTransport() {
+  transport = document.getElementById('transportSel').value;
+  startStream();
 }
 
 init3d();
-refreshModes().then(() => poll());
+refreshModes().then(() => startStream());
 </script>
 </body>
 </html>
@@ -666,32 +1725,404 @@ def index() -> str:
     return render_template_string(HTML_TEMPLATE)
 
 
-@app.route("/api/points")
-def api_points():
-    max_pts = int(flask_request.args.get("max", 32768))
-    with lock:
-        pts = latest_points or []
-        mpts = latest_motion_points or []
-        tracks = latest_tracks or []
-        fid = latest_frame_id
+# /api/points.bin: little-endian header, tracks JSON padded to 4 bytes, then
+# float32 xyz for points and motion points (n * 12 bytes each).
+POINTS_MAGIC = b"LTP1"
+POINTS_HEADER = struct.Struct("<4sIIII")  # magic, frame_id, n_points, n_motion, json_len
+
+
+# /api/stream.bin: each message is a little-endian (length, dropped) uint32
+# pair + one points packet (LTP1, or LTQ1 with ?enc=q16|q16d) whose JSON is {"tracks": [...], "stats": {...}};
+# `dropped` counts frames this client skipped.
+STREAM_PREFIX = struct.Struct("<II")
+STREAM_QUEUE_DEPTH = 2
+# Kernel send buffer per stream socket; a large autotuned buffer would hide
+# a slow client behind seconds of stale frames before the queue drops any.
+STREAM_SNDBUF = 256 * 1024
+
+# Point-count levels the point endpoints are rendered at; a request's `max`
+# is rounded down to one of these so every client shares the same bodies.
+# Levels are voxel-centroid downsamples (lidar_lod.VoxelLod).
+POINT_LODS = (4096, 16384, 32768, 131072)
+point_lods = VoxelLod(POINT_LODS)
+# Process start, so ETags from a previous run never match a new frame_id 1.
+BOOT_ID = f"{int(time.time()):x}"
 
+
+def cap_points(pts: np.ndarray, max_pts: int) -> np.ndarray:
     if len(pts) > max_pts:
         step = max(1, len(pts) // max_pts)
         pts = pts[::step][:max_pts]
-    if len(mpts) > max_pts:
-        step = max(1, len(mpts) // max_pts)
-        mpts = mpts[::step][:max_pts]
+    return pts
 
-    return jsonify({"points": pts, "motion_points": mpts, "tracks": tracks, "frame_id": fid})
 
+def point_lod(max_pts: int) -> int:
+    """Largest LOD within max_pts; below the smallest LOD, max_pts itself (see encode_points)."""
+    fit = [lod for lod in POINT_LODS if lod <= max_pts]
+    return fit[-1] if fit else max_pts
 
-@app.route("/api/stats")
-def api_stats():
+
+def requested_lod() -> int:
+    """point_lod of ?max= (default 32768); ValueError unless it is a positive integer."""
+    try:
+        max_pts = int(flask_request.args.get("max", 32768))
+    except ValueError:
+        raise ValueError("max must be an integer") from None
+    if max_pts < 1:
+        raise ValueError("max must be >= 1")
+    return point_lod(max_pts)
+
+
+def latest_frame() -> tuple[int, np.ndarray, np.ndarray, list[dict]]:
+    with lock:
+        return latest_frame_id, latest_points, latest_motion_points, latest_tracks or []
+
+
+def pack_points_frame(fid: int, pts: np.ndarray, mpts: np.ndarray, meta_obj) -> bytes:
+    meta = json.dumps(meta_obj, separators=(",", ":")).encode()
+    pad = -len(meta) % 4
+    header = POINTS_HEADER.pack(POINTS_MAGIC, fid & 0xFFFFFFFF, len(pts), len(mpts), len(meta))
+    return b"".join(
+        (
+            header,
+            meta,
+            b" " * pad,
+            np.ascontiguousarray(pts, dtype="<f4").tobytes(),
+            np.ascontiguousarray(mpts, dtype="<f4").tobytes(),
+        )
+    )
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "identity":
+        return body
+    # gzip and zlib ("deflate" in HTTP) share the codec; wbits picks the wrapper.
+    c = zlib.compressobj(1, zlib.DEFLATED, 31 if encoding == "gzip" else 15)
+    return c.compress(body) + c.flush()
+
+
+class EncodedFrameCache:
+    """Encoded point bodies per frame_id and variant, built once and shared.
+
+    A variant is (format, lod, content-encoding). The first request for a
+    variant of a frame claims it and encodes it outside the cache lock;
+    concurrent requests for the same variant wait for that one build, and
+    every later request, from any client, gets the same bytes. Only the
+    newest `frames` frame ids are kept, enough for stream clients that lag
+    a frame behind.
+    """
+
+    class _Build:
+        __slots__ = ("done", "value", "failed")
+
+        def __init__(self) -> None:
+            self.done = threading.Event()
+            self.value = None
+            self.failed = False
+
+    def __init__(self, frames: int = 3) -> None:
+        self.frames = frames
+        self.encodes = 0
+        self.hits = 0
+        self._by_frame = {}
+        self._lock = threading.Lock()
+
+    def get(self, fid: int, variant: tuple, build) -> bytes:
+        with self._lock:
+            bodies = self._by_frame.get(fid)
+            if bodies is None:
+                bodies = self._by_frame[fid] = {}
+                while len(self._by_frame) > self.frames:
+                    # By id, so a late request for an old frame never evicts a newer one.
+                    del self._by_frame[min(self._by_frame)]
+            slot = bodies.get(variant)
+            owner = slot is None
+            if owner:
+                slot = bodies[variant] = self._Build()
+                self.encodes += 1
+            else:
+                self.hits += 1
+        if not owner:
+            slot.done.wait()
+            return build() if slot.failed else slot.value
+        try:
+            slot.value = build()
+        except BaseException:
+            slot.failed = True
+            with self._lock:
+                if bodies.get(variant) is slot:
+                    del bodies[variant]
+            raise
+        finally:
+            slot.done.set()
+        return slot.value
+
+
+frame_cache = EncodedFrameCache()
+
+
+# Binary point encodings: "f32" = LTP1 float32 packets, "q16"/"q16d" = LTQ1
+# int16 packets (lidar_pointcodec), optionally compressed inside the packet.
+POINT_ENCODINGS = ["f32"] + lidar_pointcodec.ENCODINGS
+
+
+def point_codec() -> tuple[str, str]:
+    """(encoding, compression) from ?enc=&comp= or an `X-Point-Codec: enc[+comp]` header."""
+    enc, _, comp = flask_request.headers.get("X-Point-Codec", "").partition("+")
+    enc = flask_request.args.get("enc", enc or "f32")
+    comp = flask_request.args.get("comp", comp or "none")
+    if enc not in POINT_ENCODINGS:
+        raise ValueError(f"enc must be one of {POINT_ENCODINGS}")
+    if comp not in lidar_pointcodec.available_compressions():
+        raise ValueError(f"comp must be one of {lidar_pointcodec.available_compressions()}")
+    return enc, ("none" if enc == "f32" else comp)
+
+
+def encode_points(
+    fmt: str,
+    fid: int,
+    lod: int,
+    pts: np.ndarray,
+    mpts: np.ndarray,
+    tracks: list[dict],
+    codec: tuple[str, str] = ("f32", "none"),
+) -> bytes:
+    # All LOD levels of a frame are built together, once, on first use; a
+    # budget below the smallest level is a plain stride over it.
+    lods = frame_cache.get(fid, ("lod",), lambda: point_lods.build(pts))
+    pts = lods[lod] if lod in lods else cap_points(lods[POINT_LODS[0]], lod)
+    mpts = cap_points(mpts, lod)
+    if fmt == "json":
+        body = {"points": pts.tolist(), "motion_points": mpts.tolist(), "tracks": tracks, "frame_id": fid}
+        return json.dumps(body, separators=(",", ":")).encode()
+    meta = {"tracks": tracks, "stats": stats_snapshot()} if fmt == "stream" else tracks
+    enc, comp = codec
+    if enc == "f32":
+        return pack_points_frame(fid, pts, mpts, meta)
+    return lidar_pointcodec.encode(fid, pts, mpts, meta, delta=enc == "q16d", compression=comp)
+
+
+def cached_points_response(fmt: str, mimetype: str) -> Response:
+    """Latest frame as `fmt` with ETag/If-None-Match and gzip/deflate from the shared cache."""
+    try:
+        lod = requested_lod()
+        codec = point_codec() if fmt != "json" else ("f32", "none")
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    fid, pts, mpts, tracks = latest_frame()
+    xyz_demand["t"] = time.time()
+    accept = flask_request.accept_encodings
+    encoding = "gzip" if accept["gzip"] else "deflate" if accept["deflate"] else "identity"
+    if codec[1] != "none":
+        encoding = "identity"  # already compressed inside the packet
+    etag = f"{BOOT_ID}-{fid}-{fmt}{lod}-{codec[0]}-{codec[1]}-{encoding}"
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding, X-Point-Codec", "ETag": f'"{etag}"'}
+    if flask_request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    def encode() -> bytes:
+        return encode_points(fmt, fid, lod, pts, mpts, tracks, codec)
+
+    def build() -> bytes:
+        # The identity body is its own cache entry, shared with every encoding.
+        return compress_body(frame_cache.get(fid, (fmt, lod, codec, "identity"), encode), encoding)
+
+    body = frame_cache.get(fid, (fmt, lod, codec, encoding), build if encoding != "identity" else encode)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, mimetype=mimetype, headers=headers)
+
+
+@app.route("/api/points")
+def api_points():
+    return cached_points_response("json", "application/json")
+
+
+@app.route("/api/points.bin")
+def api_points_bin():
+    return cached_points_response("bin", "application/octet-stream")
+
+
+def subscribe_stream() -> FrameQueue:
+    """Cap the request socket's send buffer and subscribe it to frame_hub."""
+    sock = flask_request.environ.get("werkzeug.socket")
+    if sock is not None:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, STREAM_SNDBUF)
+        except OSError:
+            pass
+    return frame_hub.subscribe(STREAM_QUEUE_DEPTH)
+
+
+@app.route("/api/stream.bin")
+def api_stream_bin():
+    """Push every new frame once; a slow reader skips stale frames instead of queueing them."""
+    try:
+        lod = requested_lod()
+        codec = point_codec()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    xyz_demand["t"] = time.time()
+    q = subscribe_stream()
+
+    def gen():
+        try:
+            while running:
+                item = q.get(1.0)
+                if item is None:
+                    continue
+                fid, pts, mpts, tracks = item[:4]
+                xyz_demand["t"] = time.time()
+                body = frame_cache.get(
+                    fid,
+                    ("stream", lod, codec, "identity"),
+                    lambda: encode_points("stream", fid, lod, pts, mpts, tracks, codec),
+                )
+                yield STREAM_PREFIX.pack(len(body), q.dropped) + body
+        finally:
+            frame_hub.unsubscribe(q)
+
+    return Response(
+        gen(),
+        mimetype="application/octet-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/lut.bin")
+def api_lut_bin():
+    """LTL1 lookup table for /api/range.bin; fetch again when a packet's lut_version changes."""
+    with lock:
+        version, lut, h, w = lut_state["version"], lut_state["lut"], lut_state["h"], lut_state["w"]
+    if lut is None:
+        return jsonify({"ok": False, "error": "no sensor geometry yet"}), 503
+    etag = f"{BOOT_ID}-lut{version}"
+    headers = {"Cache-Control": "no-cache", "ETag": f'"{etag}"', "Vary": "Accept-Encoding"}
+    if flask_request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    encoding = "gzip" if flask_request.accept_encodings["gzip"] else "identity"
+    body = compress_body(lidar_pointcodec.encode_lut(version, h, w, lut), encoding)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, mimetype="application/octet-stream", headers=headers)
+
+
+@app.route("/api/range.bin")
+def api_range_bin():
+    """Stream of LTR1 range-image packets (same framing and backpressure as /api/stream.bin).
+
+    ?bits=16|32 picks pixel width, ?comp= the in-packet compression.
+    """
+    bits = 32 if flask_request.args.get("bits") == "32" else 16
+    comp = flask_request.args.get("comp", "deflate")
+    if comp not in lidar_pointcodec.available_compressions():
+        return jsonify({"ok": False, "error": f"comp must be one of {lidar_pointcodec.available_compressions()}"}), 400
+    q = subscribe_stream()
+
+    def build(fid, mpts, tracks, range_img, version) -> bytes:
+        meta = {"tracks": tracks, "stats": stats_snapshot()}
+        return lidar_pointcodec.encode_range(
+            fid, version, range_img, mpts, meta, RANGE_MIN_MM, RANGE_MAX_MM, bits, comp
+        )
+
+    def gen():
+        try:
+            while running:
+                item = q.get(1.0)
+                if item is None or item[4] is None:
+                    continue
+                fid, _, mpts, tracks, range_img, version = item
+                body = frame_cache.get(
+                    fid, ("range", bits, comp), lambda: build(fid, mpts, tracks, range_img, version)
+                )
+                yield STREAM_PREFIX.pack(len(body), q.dropped) + body
+        finally:
+            frame_hub.unsubscribe(q)
+
+    return Response(
+        gen(),
+        mimetype="application/octet-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+def stats_snapshot() -> dict:
+    if data_plane_stats is not None:
+        d = dict(data_plane_stats)
+        d["stats_age_s"] = time.time() - data_plane_stats_t
+        if d["stats_age_s"] > DATA_PLANE_STALE_S:
+            d["connected"] = False
+        d["stream_clients"] = len(frame_hub)
+        d["frame_cache_encodes"] = frame_cache.encodes
+        d["frame_cache_hits"] = frame_cache.hits
+        return d
     d = dict(smoothed_stats)
     d["connected"] = lidar_connected
     d["lidar_mode"] = lidar_state.get("mode", "unknown")
     d["bg_ready"] = motion_cfg["bg_ready"]
-    return jsonify(d)
+    d["bg_model"] = motion_cfg["bg_model"]
+    d["motion_backend"] = motion_cfg["backend"]
+    d["ingest_mode"] = ingest_cfg["mode"]
+    d["stats_only"] = ingest_cfg["stats_only"]
+    d["ts_mode"] = ingest_cfg["ts_mode"]
+    d["ts_mode_active"] = ingest_state["ts_mode_active"]
+    d["clock_source"] = ingest_state["clock_source"]
+    with lock:
+        d["gap_windows"] = dict(gap_windows)
+    d["kernel_drops_source"] = ingest_state["kernel_drops_source"]
+    d["stream_clients"] = len(frame_hub)
+    d["frame_cache_encodes"] = frame_cache.encodes
+    d["frame_cache_hits"] = frame_cache.hits
+    return d
+
+
+@app.route("/api/stats")
+def api_stats():
+    return jsonify(stats_snapshot())
+
+
+@app.route("/api/stats/stream")
+def api_stats_stream():
+    """Server-Sent Events: every processed frame's unsmoothed stats, in `seq` order.
+
+    Resumes after `Last-Event-ID` (or ?after=seq) from the last STATS_HISTORY
+    records; `seq` restarts at 1 when `boot_id` changes.
+    """
+    after = flask_request.headers.get("Last-Event-ID") or flask_request.args.get("after")
+    try:
+        after = int(after) if after else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "Last-Event-ID / after must be a frame seq"}), 400
+    q = stats_hub.subscribe(STATS_STREAM_DEPTH)
+    with lock:
+        backlog = [e for e in stats_history if after is not None and e[0] > after]
+
+    def gen():
+        last = after if after is not None else -1
+        try:
+            # Sent at once so clients see the stream open before the first frame.
+            yield b"retry: 1000\n\n"
+            for seq, event in backlog:
+                last = seq
+                yield event
+            while running:
+                item = q.get(1.0)
+                if item is None:
+                    yield b": keepalive\n\n"
+                    continue
+                seq, event = item
+                if seq <= last:
+                    continue  # already sent from the backlog
+                last = seq
+                yield event
+        finally:
+            stats_hub.unsubscribe(q)
+
+    return Response(
+        gen(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/api/lidar/config")
@@ -709,6 +2140,7 @@ def api_lidar_config():
             "timestamp_mode": lidar_state.get("timestamp_mode", "unknown"),
             "supported_modes": SUPPORTED_LIDAR_MODES,
             "reinit_in_progress": lidar_state.get("sensor_reinit_in_progress", False),
+            "data_port": data_plane_cfg["port"],
         }
     )
 
@@ -732,6 +2164,76 @@ def api_reset_bg():
     return jsonify({"ok": True})
 
 
+@app.route("/api/motion/config", methods=["GET", "POST"])
+def api_motion_config():
+    if flask_request.method == "POST":
+        d = flask_request.json or {}
+        try:
+            bg_model = d.get("bg_model", motion_cfg["bg_model"])
+            if bg_model not in BG_MODELS:
+                raise ValueError(f"bg_model must be one of {BG_MODELS}")
+            backend = d.get("backend", motion_cfg["backend"])
+            if backend not in MOTION_BACKENDS:
+                raise ValueError(f"backend must be one of {MOTION_BACKENDS}")
+            horizon = max(2, int(d.get("bg_horizon_frames", motion_cfg["bg_horizon_frames"])))
+            occupancy = min(1.0, max(0.0, float(d.get("bg_occupancy", motion_cfg["bg_occupancy"]))))
+            max_voxels = max(1000, int(d.get("bg_max_voxels", motion_cfg["bg_max_voxels"])))
+            budget_ms = max(1.0, float(d.get("budget_ms", motion_cfg["budget_ms"])))
+            adaptive = bool(d.get("adaptive", motion_cfg["adaptive"]))
+        except (TypeError, ValueError) as e:
+            return jsonify({"ok": False, "error": str(e)})
+        if motion_state["snapshot_name"] and (bg_model, backend) != (motion_cfg["bg_model"], motion_cfg["backend"]):
+            # Model switch: keep the outgoing background and warm-start the incoming one.
+            save_motion_snapshot(motion_state["snapshot_name"])
+            motion_state["snapshot_name"] = None
+        motion_cfg["bg_model"] = bg_model
+        motion_cfg["backend"] = backend
+        motion_cfg["bg_horizon_frames"] = horizon
+        motion_cfg["bg_occupancy"] = occupancy
+        motion_cfg["bg_max_voxels"] = max_voxels
+        motion_cfg["budget_ms"] = budget_ms
+        motion_cfg["adaptive"] = adaptive
+        _decimation.budget_ms = budget_ms
+        if not adaptive:
+            _decimation.reset()
+        reset_motion_background()
+    return jsonify(
+        {
+            "ok": True,
+            **{
+                k: motion_cfg[k]
+                for k in ("backend", "bg_model", "bg_horizon_frames", "bg_occupancy", "bg_max_voxels", "adaptive", "budget_ms")
+            },
+            "decimation_level": _decimation.level,
+            "effective_voxel_m": effective_voxel_m(),
+            "stride": _decimation.stride,
+            "bg_voxels": _bg_model.size if motion_cfg["bg_model"] == "decay" else int(_bg_keys.size),
+            "bg_evictions": _bg_model.evictions,
+            "bg_overflow": _bg_model.overflow,
+            "bg_table_bytes": _bg_model.nbytes,
+            "ri_foreground_pixels": _ri_model.foreground_pixels if _ri_model is not None else 0,
+            "bg_snapshot": motion_state["snapshot_name"],
+            "bg_restored": motion_state["restored"],
+            "bg_snapshot_writes": bg_store.writes if bg_store is not None else 0,
+        }
+    )
+
+
+@app.route("/api/motion/roi", methods=["GET", "POST"])
+def api_motion_roi():
+    global _roi
+    if flask_request.method == "POST":
+        d = flask_request.json or {}
+        try:
+            boxes = d.get("boxes", [])
+            arr = roi_boxes(boxes)
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({"ok": False, "error": str(e)})
+        motion_cfg["roi"] = [{"min": b[0].tolist(), "max": b[1].tolist()} for b in arr]
+        _roi = arr
+    return jsonify({"ok": True, "boxes": motion_cfg["roi"]})
+
+
 @app.route("/api/gate", methods=["POST"])
 def api_gate():
     d = flask_request.json or {}
@@ -767,29 +2269,165 @@ def api_gate_multi():
     return jsonify({"ok": True, "desc": desc, **tas_state})
 
 
+def data_plane_guard():
+    if flask_request.path not in DATA_PLANE_PATHS:
+        return jsonify({"ok": False, "error": "served by the main web server, not the data plane"}), 404
+    return None
+
+
+def data_route_redirect():
+    """Main port with --data-port: send the data endpoints to the data plane instead of serving them here."""
+    if flask_request.path not in DATA_PLANE_REDIRECT_PATHS:
+        return None
+    host = urlsplit(flask_request.host_url).hostname
+    if ":" in host:
+        host = f"[{host}]"
+    query = flask_request.query_string.decode("latin-1")
+    url = f"{flask_request.scheme}://{host}:{data_plane_cfg['port']}{flask_request.path}"
+    return redirect(f"{url}?{query}" if query else url, code=307)
+
+
+def data_plane_reader() -> None:
+    """Data-plane process: mirror the shared frame into the usual latest-frame globals."""
+    global data_plane_stats, data_plane_stats_t
+    fid = -1
+    while running:
+        data_plane.touch_demand(xyz_demand["t"])
+        lut = data_plane.read_lut(lut_state["version"])
+        if lut is not None:
+            # Local copy only: writing it back through set_lut would make this
+            # process a second writer of the shared LUT seqlock.
+            version, h, w, xyz_lut = lut
+            with lock:
+                lut_state.update(version=version, lut=xyz_lut, h=h, w=w)
+        frame = data_plane.read(fid)
+        if frame is None:
+            time.sleep(0.002)
+            continue
+        fid = frame["fid"]
+        meta = json.loads(frame["meta"])
+        data_plane_stats = meta["stats"]
+        data_plane_stats_t = meta["t"]
+        set_latest_frame(fid, frame["pts"], frame["mpts"], meta["tracks"], frame["range"], frame["lut_version"])
+
+
+def data_plane_main(shm_name: str, host: str, port: int) -> None:
+    """Entry point of the data-plane process (see start_data_plane)."""
+    global data_plane
+    data_plane = FrameShm(shm_name)
+    app.before_request(data_plane_guard)
+    threading.Thread(target=data_plane_reader, daemon=True).start()
+    try:
+        app.run(host=host, port=port, debug=False, threaded=True)
+    except KeyboardInterrupt:
+        pass
+
+
+def start_data_plane(host: str, port: int) -> multiprocessing.Process:
+    """Create the shared frame block and spawn the process serving DATA_PLANE_PATHS on `port`."""
+    global data_plane
+    data_plane = FrameShm(create=True)
+    data_plane_cfg["port"] = port
+    # spawn: a fresh interpreter, none of this process's threads or sockets.
+    proc = multiprocessing.get_context("spawn").Process(
+        target=data_plane_main, args=(data_plane.name, host, port), name="lidar-data-plane", daemon=True
+    )
+    proc.start()
+    return proc
+
+
+def stop_data_plane(proc: multiprocessing.Process | None) -> None:
+    global data_plane
+    if proc is not None:
+        proc.terminate()
+        proc.join(2.0)
+    if data_plane is not None:
+        shm, data_plane = data_plane, None
+        shm.close()
+        shm.unlink()
+
+
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="LiDAR TAS web server v2")
     p.add_argument("--host", default="0.0.0.0")
     p.add_argument("--port", type=int, default=8081)
+    p.add_argument(
+        "--data-port",
+        type=int,
+        default=0,
+        help="serve points/stream from a separate process on this port; --port redirects there "
+        "(default 0: serve them from --port)",
+    )
     p.add_argument("--lidar-host", default=DEFAULT_LIDAR_HOST)
     p.add_argument("--lidar-port", type=int, default=DEFAULT_LIDAR_PORT)
     p.add_argument("--keti-tsn-dir", default=DEFAULT_KETI_TSN_DIR)
+    p.add_argument("--ingest", choices=INGEST_MODES, default="pool", help="LiDAR UDP ingest path")
+    p.add_argument("--mmsg-batch", type=int, default=32, help="datagrams per recvmmsg call for --ingest mmsg")
+    p.add_argument(
+        "--ts-mode",
+        choices=TIMESTAMP_MODES,
+        default="kernel",
+        help="packet receive timestamps for gap stats: user clock, kernel SO_TIMESTAMPNS or NIC hardware",
+    )
+    p.add_argument("--ts-iface", default="", help="with --ts-mode hw: enable NIC RX stamping on this interface")
+    p.add_argument(
+        "--stats-only",
+        action="store_true",
+        help="headless sweep mode: frame stats from packet headers, no XYZ/motion/point cloud",
+    )
+    p.add_argument("--proc-queue", type=int, default=2, help="completed scans buffered for processing (drop-oldest)")
+    p.add_argument("--motion-backend", choices=MOTION_BACKENDS, default="voxel", help="motion segmentation backend")
+    p.add_argument("--bg-model", choices=BG_MODELS, default="decay", help="motion background model")
+    p.add_argument("--bg-horizon-frames", type=int, default=300, help="frames for --bg-model decay to absorb static changes")
+    p.add_argument(
+        "--bg-snapshot-dir",
+        default="/home/kim/lidar-tas260226/data/bg_snapshots",
+        help="persist motion backgrounds here for warm start ('' disables)",
+    )
+    p.add_argument("--bg-snapshot-s", type=float, default=30.0, help="seconds between background snapshots")
+    p.add_argument("--roi", default="", help='motion ROI boxes as JSON: [{"min":[x,y,z],"max":[x,y,z]}, ...]')
+    p.add_argument("--motion-budget-ms", type=float, default=50.0, help="per-frame motion budget for adaptive decimation")
+    p.add_argument("--no-adaptive", action="store_true", help="disable adaptive decimation (voxel backend)")
     p.add_argument("--no-tas-init", action="store_true", help="skip all-open TAS init on startup")
     return p.parse_args()
 
 
 def main() -> None:
-    global running
+    global running, bg_store, _roi
     args = parse_args()
 
     lidar_state["host"] = args.lidar_host
     app.config["KETI_TSN_DIR"] = args.keti_tsn_dir
+    ingest_cfg["mode"] = args.ingest
+    ingest_cfg["mmsg_batch"] = max(1, args.mmsg_batch)
+    ingest_cfg["stats_only"] = args.stats_only
+    ingest_cfg["ts_mode"] = args.ts_mode
+    ingest_cfg["ts_iface"] = args.ts_iface
+    motion_cfg["bg_model"] = args.bg_model
+    motion_cfg["backend"] = args.motion_backend
+    motion_cfg["bg_horizon_frames"] = max(2, args.bg_horizon_frames)
+    motion_cfg["bg_snapshot_s"] = max(1.0, args.bg_snapshot_s)
+    motion_cfg["budget_ms"] = max(1.0, args.motion_budget_ms)
+    motion_cfg["adaptive"] = not args.no_adaptive
+    _decimation.budget_ms = motion_cfg["budget_ms"]
+    if args.roi:
+        _roi = roi_boxes(json.loads(args.roi))
+        motion_cfg["roi"] = [{"min": b[0].tolist(), "max": b[1].tolist()} for b in _roi]
+    reset_motion_background()
+    if args.bg_snapshot_dir:
+        try:
+            bg_store = BackgroundStore(args.bg_snapshot_dir)
+        except OSError as e:
+            print(f"background snapshots disabled, {args.bg_snapshot_dir} not usable: {e}")
 
     print("=" * 60)
     print("LiDAR TAS v2")
     print(f"Web UI:      http://127.0.0.1:{args.port}")
+    print(f"Data plane:  {f'http://127.0.0.1:{args.data_port} (separate process)' if args.data_port else 'in-process'}")
     print(f"LiDAR host:  {args.lidar_host}:{args.lidar_port}")
     print(f"KETI TSN:    {args.keti_tsn_dir}")
+    print(f"Ingest:      {args.ingest}{' (stats-only)' if args.stats_only else ''}")
+    print(f"RX stamps:   {args.ts_mode}")
     print("Features: mode switch + background motion tracking + TAS gate API")
     print("=" * 60)
 
@@ -800,13 +2438,25 @@ def main() -> None:
         except Exception as e:
             print(f"startup TAS init failed: {e}")
 
+    frame_queue.maxlen = max(1, args.proc_queue)
+    data_proc = start_data_plane(args.host, args.data_port) if args.data_port else None
+    if data_proc is not None:
+        # Keep HTTP load for the data endpoints out of the ingest process entirely.
+        app.before_request(data_route_redirect)
+
     t = threading.Thread(target=lidar_thread, args=(args.lidar_host, args.lidar_port), daemon=True)
     t.start()
+    threading.Thread(target=processing_thread, daemon=True).start()
 
     try:
         app.run(host=args.host, port=args.port, debug=False, threaded=True)
     except KeyboardInterrupt:
         running = False
+    finally:
+        if bg_store is not None and motion_state["snapshot_name"]:
+            save_motion_snapshot(motion_state["snapshot_name"])
+            bg_store.flush(5.0)
+        stop_data_plane(data_proc)
 
 
 if __name__ == "__main__":
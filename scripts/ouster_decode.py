@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Pure-NumPy Ouster lidar packet decoder (no ouster.sdk needed).
+
+Packet geometry follows the same rules as `expected_packet_size` /
+`build_layout` in the analysis scripts: 32B packet header, per column a 12B
+header (timestamp u64, measurement_id u16, status u16) followed by
+pixels_per_column channel blocks, then a 32B packet footer. The whole
+packet is expressed as one structured dtype so a batch of packets decodes
+with a single `np.frombuffer` call.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+PACKET_HEADER_BYTES = 32
+COLUMN_HEADER_BYTES = 12
+PACKET_FOOTER_BYTES = 32
+
+RANGE19_MASK = 0x7FFFF
+RANGE15_MASK = 0x7FFF
+# Low data rate profile reports range in 8 mm units and NIR divided by 16.
+RANGE15_UNIT_MM = 8
+NIR8_SCALE = 16
+
+# Channel block layout per profile (little endian, Ouster sensor data docs).
+_PIXEL_FIELDS = {
+    "RNG19_RFL8_SIG16_NIR16": [
+        ("range_word", "<u4"),
+        ("reflectivity", "u1"),
+        ("_pad0", "u1"),
+        ("signal", "<u2"),
+        ("nir", "<u2"),
+        ("_pad1", "<u2"),
+    ],
+    "RNG15_RFL8_NIR8": [
+        ("range_word", "<u2"),
+        ("reflectivity", "u1"),
+        ("nir", "u1"),
+    ],
+    # Reflectivity lives in the top byte of each return's range word.
+    "RNG19_RFL8_SIG16_NIR16_DUAL": [
+        ("range_word", "<u4"),
+        ("range2_word", "<u4"),
+        ("signal", "<u2"),
+        ("signal2", "<u2"),
+        ("nir", "<u2"),
+        ("_pad0", "<u2"),
+    ],
+}
+
+SUPPORTED_PROFILES = list(_PIXEL_FIELDS)
+
+
+def _profile_key(profile) -> str:
+    # Accept plain strings as well as ouster.sdk UDPProfileLidar enums.
+    p = str(profile).strip().upper()
+    return p.rsplit(".", 1)[-1]
+
+
+def channel_block_bytes(profile) -> int:
+    return pixel_dtype(profile).itemsize
+
+
+def pixel_dtype(profile) -> np.dtype:
+    key = _profile_key(profile)
+    if key not in _PIXEL_FIELDS:
+        raise ValueError(f"unsupported udp_profile_lidar: {profile}")
+    return np.dtype(_PIXEL_FIELDS[key])
+
+
+def column_dtype(profile, pixels_per_column: int) -> np.dtype:
+    return np.dtype(
+        [
+            ("timestamp", "<u8"),
+            ("measurement_id", "<u2"),
+            ("status", "<u2"),
+            ("pixels", pixel_dtype(profile), (pixels_per_column,)),
+        ]
+    )
+
+
+def packet_dtype(profile, columns_per_packet: int, pixels_per_column: int) -> np.dtype:
+    return np.dtype(
+        [
+            ("packet_type", "<u2"),
+            ("frame_id", "<u2"),
+            # init_id (24 bit) followed by serial number (40 bit).
+            ("init_sn", "<u8"),
+            ("_header", f"V{PACKET_HEADER_BYTES - 12}"),
+            ("columns", column_dtype(profile, pixels_per_column), (columns_per_packet,)),
+            ("_footer", f"V{PACKET_FOOTER_BYTES}"),
+        ]
+    )
+
+
+def expected_packet_size(profile, columns_per_packet: int, pixels_per_column: int) -> int:
+    return packet_dtype(profile, columns_per_packet, pixels_per_column).itemsize
+
+
+class PacketDecoder:
+    """Vectorized decoder for a fixed (profile, columns_per_packet, pixels_per_column)."""
+
+    def __init__(self, profile, columns_per_packet: int, pixels_per_column: int, columns_per_frame: int = 0) -> None:
+        self.profile = _profile_key(profile)
+        self.columns_per_packet = columns_per_packet
+        self.pixels_per_column = pixels_per_column
+        self.columns_per_frame = columns_per_frame
+        self.dtype = packet_dtype(profile, columns_per_packet, pixels_per_column)
+        self.packet_size = self.dtype.itemsize
+        self.dual = self.profile.endswith("_DUAL")
+
+    @classmethod
+    def from_config(cls, cfg: dict, md: dict) -> "PacketDecoder":
+        fmt = md["lidar_data_format"]
+        return cls(
+            cfg.get("udp_profile_lidar", fmt.get("udp_profile_lidar", "RNG19_RFL8_SIG16_NIR16")),
+            int(cfg.get("columns_per_packet", fmt.get("columns_per_packet", 16))),
+            int(fmt["pixels_per_column"]),
+            int(fmt["columns_per_frame"]),
+        )
+
+    def view(self, packets) -> np.ndarray:
+        """Zero-copy structured view over concatenated packets (bytes or uint8 array)."""
+        buf = packets if isinstance(packets, (bytes, bytearray, memoryview)) else np.ascontiguousarray(packets)
+        n = memoryview(buf).nbytes // self.packet_size
+        return np.frombuffer(buf, dtype=self.dtype, count=n)
+
+    def decode(self, packets) -> dict:
+        """Decode a batch of packets.
+
+        Column fields come back shaped (n_packets, columns_per_packet) and
+        channel fields (n_packets, columns_per_packet, pixels_per_column).
+        Range is in millimetres for every profile.
+        """
+        arr = self.view(packets)
+        cols = arr["columns"]
+        px = cols["pixels"]
+        out = {
+            "packet_type": arr["packet_type"],
+            "frame_id": arr["frame_id"],
+            "init_id": (arr["init_sn"] & 0xFFFFFF).astype(np.uint32),
+            "serial": arr["init_sn"] >> 24,
+            "timestamp": cols["timestamp"],
+            "measurement_id": cols["measurement_id"],
+            "status": cols["status"],
+        }
+        if self.profile == "RNG15_RFL8_NIR8":
+            out["range"] = (px["range_word"] & RANGE15_MASK).astype(np.uint32) * RANGE15_UNIT_MM
+            out["reflectivity"] = px["reflectivity"]
+            out["nir"] = px["nir"].astype(np.uint16) * NIR8_SCALE
+            out["signal"] = np.zeros_like(out["nir"])
+        elif self.dual:
+            out["range"] = px["range_word"] & RANGE19_MASK
+            out["reflectivity"] = (px["range_word"] >> 24).astype(np.uint8)
+            out["range2"] = px["range2_word"] & RANGE19_MASK
+            out["reflectivity2"] = (px["range2_word"] >> 24).astype(np.uint8)
+            out["signal"] = px["signal"]
+            out["signal2"] = px["signal2"]
+            out["nir"] = px["nir"]
+        else:
+            out["range"] = px["range_word"] & RANGE19_MASK
+            out["reflectivity"] = px["reflectivity"]
+            out["signal"] = px["signal"]
+            out["nir"] = px["nir"]
+        return out
+
+    def to_images(self, decoded: dict, fields=("range", "reflectivity", "signal", "nir")) -> dict:
+        """Scatter decoded columns into (pixels_per_column, columns_per_frame) staggered images.
+
+        Columns are placed by measurement_id and only when their status bit
+        is set, matching what ScanBatcher leaves in a LidarScan.
+        """
+        if not self.columns_per_frame:
+            raise ValueError("columns_per_frame is required to build images")
+        h = self.pixels_per_column
+        w = self.columns_per_frame
+        mid = decoded["measurement_id"].reshape(-1)
+        ok = ((decoded["status"].reshape(-1) & 1) != 0) & (mid < w)
+        mid = mid[ok]
+        images = {}
+        for name in fields:
+            src = decoded[name].reshape(-1, h)[ok]
+            img = np.zeros((h, w), dtype=src.dtype)
+            img[:, mid] = src.T
+            images[name] = img
+        status = np.zeros(w, dtype=np.uint32)
+        status[mid] = decoded["status"].reshape(-1)[ok]
+        ts = np.zeros(w, dtype=np.uint64)
+        ts[mid] = decoded["timestamp"].reshape(-1)[ok]
+        images["status"] = status
+        images["timestamp"] = ts
+        return images
@@ -13,9 +13,7 @@ from __future__ import annotations
 
 import argparse
 import json
-import socket
 import statistics
-import struct
 import time
 from datetime import datetime
 from pathlib import Path
@@ -23,6 +21,8 @@ from pathlib import Path
 import matplotlib.pyplot as plt
 import requests
 
+from lidar_rx import TIMESTAMP_MODES, capture_udp
+
 DOC_URL = (
     "https://static.ouster.dev/sensor-docs/image_route1/image_route2/"
     "sensor_data/sensor-data.html#lidar-data-packet-format"
@@ -85,30 +85,6 @@ def set_mode(host: str, mode: str, settle_s: float) -> tuple[dict, dict]:
     return query_sensor(host)
 
 
-def capture_udp(port: int, duration_s: float, rcvbuf: int) -> list[dict]:
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
-    sock.bind(("0.0.0.0", port))
-    sock.settimeout(1.0)
-    t0 = time.perf_counter()
-    rows = []
-
-    while time.perf_counter() - t0 < duration_s:
-        try:
-            data, _ = sock.recvfrom(65535)
-            t = time.perf_counter()
-            frame_id = None
-            packet_type = None
-            if len(data) >= 4:
-                packet_type, frame_id = struct.unpack_from("<HH", data, 0)
-            rows.append({"t_s": t, "len": len(data), "frame_id": frame_id, "packet_type": packet_type})
-        except socket.timeout:
-            continue
-
-    sock.close()
-    return rows
-
-
 def summarize(rows: list[dict], pps_expected: float, size_expected: int) -> dict:
     if len(rows) < 4:
         raise RuntimeError("not enough packets captured")
@@ -164,6 +140,14 @@ def main() -> None:
     ap.add_argument("--outdir", default="/home/kim/lidar-tas260226/data")
     ap.add_argument("--modes", nargs="*", default=MODES)
     ap.add_argument("--restore-mode", default="1024x20")
+    ap.add_argument("--rx-backend", choices=["mmsg", "recvfrom"], default="mmsg")
+    ap.add_argument("--rx-batch", type=int, default=64, help="datagrams per recvmmsg call")
+    ap.add_argument(
+        "--ts-mode",
+        choices=TIMESTAMP_MODES,
+        default="kernel",
+        help="receive timestamps: user clock, kernel SO_TIMESTAMPNS or NIC hardware",
+    )
     args = ap.parse_args()
 
     outdir = Path(args.outdir)
@@ -177,7 +161,9 @@ def main() -> None:
         cfg, md = set_mode(args.host, mode, args.settle_s)
         pps_exp = expected_pps(cfg, md)
         size_exp = expected_packet_size(cfg, md)
-        cap = capture_udp(args.port, args.duration_s, 8 * 1024 * 1024)
+        cap, rx_info = capture_udp(
+            args.port, args.duration_s, 8 * 1024 * 1024, args.rx_backend, args.rx_batch, args.ts_mode
+        )
         summary = summarize(cap, pps_exp, size_exp)
 
         hist_png = outdir / f"{stem}_{mode}_dt_hist.png"
@@ -191,6 +177,9 @@ def main() -> None:
                 "columns_per_packet": cfg.get("columns_per_packet"),
                 "columns_per_frame": md["lidar_data_format"]["columns_per_frame"],
                 "pixels_per_column": md["lidar_data_format"]["pixels_per_column"],
+                "rx_backend": rx_info["backend"],
+                "kernel_drops": rx_info["kernel_drops"],
+                "clock_source": rx_info["clock_source"],
                 "summary": summary,
                 "dt_hist_png": str(hist_png),
             }
@@ -11,12 +11,15 @@ from pathlib import Path
 
 import requests
 
+from lidar_stats_stream import collect_stats
+
 
 ROOT = Path("/home/kim/lidar-tas260226")
 KETI_DIR = Path("/home/kim/keti-tsn-cli-new")
 FETCH_YAML = Path("/home/kim/lidar-tas/configs/fetch-tas.yaml")
 ALL_OPEN_YAML = ROOT / "configs" / "tas_disable_all_open.yaml"
 SERVER_STATS_URL = "http://127.0.0.1:8080/api/stats"
+SERVER_STATS_STREAM_URL = SERVER_STATS_URL + "/stream"
 SENSOR_HOST = "192.168.6.11"
 EXPECTED_PPS = 1280.0
 
@@ -118,23 +121,28 @@ def set_sensor(phase_lock_enable):
 
 
 def measure_stats(duration_s, interval_s):
+    """Per-frame stats from the SSE stream; polls the EMA-smoothed /api/stats every interval_s on older servers."""
+    frames_missed = 0
     t_end = time.monotonic() + duration_s
-    pps_vals = []
-    fc_vals = []
-    gs_vals = []
-    while time.monotonic() < t_end:
-        try:
-            s = requests.get(SERVER_STATS_URL, timeout=0.8).json()
-            pps_vals.append(float(s.get("pps", 0.0)))
-            fc_vals.append(float(s.get("frame_completeness", 0.0)))
-            gs_vals.append(float(s.get("gap_stdev_us", 0.0)))
-        except Exception:
-            pass
-        time.sleep(interval_s)
+    try:
+        records, frames_missed = collect_stats(SERVER_STATS_STREAM_URL, duration_s)
+    except (requests.RequestException, ValueError):
+        # No stream, or it kept failing (bad events re-raise as ValueError): poll for the rest of the window.
+        records = []
+        while time.monotonic() < t_end:
+            try:
+                records.append(requests.get(SERVER_STATS_URL, timeout=0.8).json())
+            except Exception:
+                pass
+            time.sleep(interval_s)
+    pps_vals = [float(s.get("pps", 0.0)) for s in records]
+    fc_vals = [float(s.get("frame_completeness", 0.0)) for s in records]
+    gs_vals = [float(s.get("gap_stdev_us", 0.0)) for s in records]
 
     if not pps_vals:
         return {
             "samples": 0,
+            "frames_missed": frames_missed,
             "pps_mean": 0.0,
             "pps_min": 0.0,
             "completeness_pct_est": 0.0,
@@ -144,6 +152,7 @@ def measure_stats(duration_s, interval_s):
     pps_mean = statistics.mean(pps_vals)
     return {
         "samples": len(pps_vals),
+        "frames_missed": frames_missed,
         "pps_mean": pps_mean,
         "pps_min": min(pps_vals),
         "completeness_pct_est": min(100.0, pps_mean / EXPECTED_PPS * 100.0),
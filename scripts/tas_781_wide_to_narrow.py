@@ -8,8 +8,11 @@ import socket
 import statistics
 import subprocess
 import time
+from collections import Counter
 from datetime import datetime
 
+from lidar_rx import ANC_BUFSIZE, TIMESTAMP_MODES, clock_source_label, enable_rx_timestamps, parse_ancdata
+
 
 LIDAR_PORT = 7502
 EXPECTED_PPS = 1280.0
@@ -108,26 +111,48 @@ def patch_tas(keti_dir, yaml_content):
     return ok, r.stdout, r.stderr
 
 
-def measure_udp(duration_sec, rcvbuf_bytes):
+def measure_udp(duration_sec, rcvbuf_bytes, ts_mode="kernel"):
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf_bytes)
+    # Before bind, so datagrams queued before the first read carry arrival stamps.
+    ts_mode = enable_rx_timestamps(sock, ts_mode)
     sock.bind(("0.0.0.0", LIDAR_PORT))
     sock.settimeout(0.2)
 
     ts = []
+    sources = Counter()
+    # One clock per measurement: packets stamped by another clock are counted, not mixed in.
+    run_source = None
+    mismatch = 0
+    t0_ns = 0
     t0 = time.monotonic()
     while True:
         if time.monotonic() - t0 >= duration_sec:
             break
         try:
-            _data, _addr = sock.recvfrom(65535)
-            ts.append(time.perf_counter())
+            if ts_mode == "user":
+                _data, _addr = sock.recvfrom(65535)
+                ts_ns, source = time.time_ns(), "user"
+            else:
+                # Kernel/NIC receive stamp instead of Python wake-up time.
+                _data, ancdata, _flags, _addr = sock.recvmsg(65535, ANC_BUFSIZE)
+                ts_ns, source, _ = parse_ancdata(ancdata)
         except socket.timeout:
             continue
+        sources[source] += 1
+        if run_source is None:
+            run_source, t0_ns = source, ts_ns
+        elif source != run_source:
+            mismatch += 1
+            continue
+        ts.append((ts_ns - t0_ns) * 1e-9)
     sock.close()
 
     out = {
+        "ts_mode": ts_mode,
+        "clock_source": clock_source_label(sources),
+        "ts_mismatch": mismatch,
         "packets": len(ts),
         "pps": 0.0,
         "completeness_pct": 0.0,
@@ -177,6 +202,7 @@ def parse_args():
     p.add_argument("--duration", type=int, default=20)
     p.add_argument("--settle", type=float, default=1.0)
     p.add_argument("--rcvbuf", type=int, default=16 * 1024 * 1024)
+    p.add_argument("--ts-mode", choices=TIMESTAMP_MODES, default="kernel", help="packet receive timestamp source")
     p.add_argument("--base-time-mode", choices=["zero", "host-future", "switch-future", "tai-future"], default="zero")
     p.add_argument("--base-time-offset-sec", type=int, default=2)
     p.add_argument("--phase-offset-ns", type=int, default=0)
@@ -241,7 +267,7 @@ def main():
             continue
 
         time.sleep(a.settle)
-        m = measure_udp(a.duration, a.rcvbuf)
+        m = measure_udp(a.duration, a.rcvbuf, a.ts_mode)
         m.update({
             "cycle_us": a.cycle_us,
             "open_us": open_us,